@@ -1,9 +1,13 @@
 import streamlit as st
-import pandas as pd
-from datetime import time, datetime, timedelta
+from datetime import date
 from utils import (
-    load_store_config, load_cutoff_time, load_menus_from_db, save_new_order_to_db, load_orders_from_db
+    load_open_sessions, load_store, load_menu_index, load_option_index, submit_order, new_order_token,
+    ensure_scheduler, load_sessions, select_tenant_from_query_params, record_call, load_last_order, load_user_month_orders, now_tw,
+    SESSION_OPEN, ORDER_CREATED, ORDER_DUPLICATE, ORDER_UNAVAILABLE, ORDER_MAX_QUANTITY
 )
+from time import perf_counter
+
+rerun_started = perf_counter()
 
 st.set_page_config(
     page_title="點餐系統",
@@ -12,29 +16,87 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+select_tenant_from_query_params()
 
+# 記住使用者姓名：優先使用網址參數 ?name=（送出訂單後會寫回網址，可加入書籤），
+# 否則沿用這次瀏覽中上次輸入的姓名
+if "order_name" not in st.session_state:
+    st.session_state.order_name = st.query_params.get("name", "")
+profile_name = st.session_state.order_name.strip()
 
-# 載入所有店家和菜單資訊
-menus_df = load_menus_from_db()
-if not menus_df.empty:
-    menus_df['價格'] = pd.to_numeric(menus_df['價格'], errors='coerce').fillna(0).astype(int)
-    all_stores = sorted(menus_df['店家名稱'].unique().tolist())
-    all_stores = [s for s in all_stores if s]
-else:
-    all_stores = []
+def order_token_for(order):
+    """同一份訂單內容沿用同一個提交代碼，內容改變時才換新的代碼"""
+    if st.session_state.get("order_token_order") not in (None, order):
+        st.session_state.order_token = new_order_token()
+    st.session_state.order_token_order = order
+    return st.session_state.order_token
+
+def place_order(name, store_name, session_id, menu_index, item_id, option_index, option_ids=(), quantity=1):
+    """以品項與選項 id 送出訂單並顯示結果（價格由資料庫決定）；成功後記住姓名"""
+    item_name, price = menu_index[item_id]
+    options_text = "、".join(option_index[option_id][0] for option_id in option_ids)
+    line_total = (price + sum(option_index[option_id][1] for option_id in option_ids)) * quantity
+    try:
+        result = submit_order(
+            name, store_name,
+            item_id=item_id,
+            option_ids=option_ids,
+            quantity=quantity,
+            token=order_token_for((name, session_id, item_id, tuple(option_ids), quantity)),
+            session_id=session_id
+        )
+        if result == ORDER_CREATED:
+            st.query_params["name"] = name
+            item_text = f"{item_name}（{options_text}）" if options_text else item_name
+            st.success(f"🎉 訂單已送出！**{name}**，您點了 **{item_text} × {quantity}**，共 **NT$ {line_total}**。")
+        elif result == ORDER_DUPLICATE:
+            st.info("這筆訂單已經送出過了，不會重複建立。")
+        elif result == ORDER_UNAVAILABLE:
+            st.warning("⚠️ 這個品項或選項已經不在今天的菜單上，請重新選擇。")
+        else:
+            st.error("⏳ 訂餐時間已過，無法再新增訂單。")
+    except Exception as e:
+        st.error(f"送出訂單時發生錯誤: {e}")
+
+ensure_scheduler()
 
-# 載入今日店家和截止時間
-today_store_name = load_store_config()
-cutoff_time = load_cutoff_time()
+# 載入今天所有開放中的訂餐場次（今日店家設定會自動成為預設場次）
+open_sessions = {session['id']: session for session in load_open_sessions()}
 
-if not today_store_name or not all_stores:
-    st.warning("⚠️ 管理員尚未設定今日店家，請稍候。")
-    st.info("請聯絡管理員登入後台進行設定。")
+if not open_sessions:
+    # 還沒到開放時間的場次（例如下午的飲料場次）與已截止的場次分開提示
+    current_time = now_tw().time()
+    upcoming_sessions = [
+        session for session in load_sessions(status=SESSION_OPEN) if session['開放時間'] > current_time
+    ]
+    if upcoming_sessions:
+        next_session = min(upcoming_sessions, key=lambda session: session['開放時間'])
+        st.info(f"🕒 尚未開放訂餐，「{next_session['名稱']}」將於 {next_session['開放時間'].strftime('%H:%M')} 開放。")
+    elif load_sessions():
+        st.error("⏳ 訂餐時間已過，無法再新增訂單。")
+    else:
+        st.warning("⚠️ 管理員尚未設定今日店家，請稍候。")
+        st.info("請聯絡管理員登入後台進行設定。")
 else:
-    # 載入選定店家的完整資訊
-    store_info_df = menus_df[menus_df['店家名稱'] == today_store_name]
-    store_address = store_info_df['店家地址'].iloc[0] if not store_info_df.empty and '店家地址' in store_info_df.columns else "無"
-    store_phone = store_info_df['店家電話'].iloc[0] if not store_info_df.empty and '店家電話' in store_info_df.columns else "無"
+    if len(open_sessions) > 1:
+        selected_session_id = st.radio(
+            "選擇訂餐場次",
+            options=list(open_sessions.keys()),
+            format_func=lambda sid: f"{open_sessions[sid]['名稱']}｜{open_sessions[sid]['店家名稱']}",
+            horizontal=True,
+            key="order_session"
+        )
+    else:
+        selected_session_id = next(iter(open_sessions))
+    order_session = open_sessions[selected_session_id]
+
+    today_store_name = order_session['店家名稱']
+    cutoff_time = order_session['截止時間']
+
+    # 只載入此場次店家的資訊與菜單
+    today_store = load_store(today_store_name) or {}
+    store_address = today_store.get('店家地址') or "無"
+    store_phone = today_store.get('店家電話') or "無"
 
     st.header(f"今日便當店家：{today_store_name}")
     
@@ -42,9 +104,8 @@ else:
         st.write(f"**地址**：{store_address}")
         st.write(f"**電話**：{store_phone}")
 
-    # 直接將伺服器時間加上 8 小時，轉換為台灣時間
-    current_datetime_tw = datetime.utcnow() + timedelta(hours=8)
-    today_date_str = f"今天 {current_datetime_tw.month} 月 {current_datetime_tw.day} 日"
+    session_date = date.fromisoformat(order_session['日期'])
+    today_date_str = f"今天 {session_date.month} 月 {session_date.day} 日"
 
     # 格式化截止時間
     if cutoff_time.hour > 12:
@@ -58,44 +119,82 @@ else:
         
     st.markdown(f"**訂餐截止時間**：`{today_date_str} {cutoff_time_str}`")
 
-    # --- 偵錯資訊 ---
-    # 使用台灣時間的日期與截止時間進行比對
-    cutoff_datetime_tw = datetime.combine(current_datetime_tw.date(), cutoff_time)
-    
-    #st.info(f"偵錯資訊：\n\n**目前台灣時間**：`{current_datetime_tw}`\n\n**截止台灣時間**：`{cutoff_datetime_tw}`")
-    # --- 偵錯資訊 ---
+    # 截止時由排程關閉場次，之後送出的訂單由資料庫拒絕，這裡不必再比對時間
+    menu_index = load_menu_index(today_store_name)
     
-    if current_datetime_tw > cutoff_datetime_tw:
-        st.error("⏳ 訂餐時間已過，無法再新增訂單。")
+    if not menu_index:
+        st.warning("⚠️ 此店家菜單尚未設定，請通知管理員。")
     else:
-        store_menu = menus_df[menus_df['店家名稱'] == today_store_name]
-        
-        if store_menu.empty or (len(store_menu) == 1 and store_menu.iloc[0]['便當品項'] == '無'):
-            st.warning("⚠️ 此店家菜單尚未設定，請通知管理員。")
-        else:
-            st.subheader("點餐")
-            with st.form("lunch_order_form"):
-                name = st.text_input("您的姓名", key="order_name")
-                
-                menu_options = store_menu.apply(
-                    lambda row: f"{row['便當品項']} (NT$ {row['價格']})",
-                    axis=1
-                ).tolist()
-                
-                selected_item_str = st.selectbox("選擇便當品項", options=menu_options, key="order_item")
-                
-                submitted = st.form_submit_button("送出訂單")
-                
-                if submitted:
-                    if not name:
-                        st.error("請輸入您的姓名。")
-                    else:
-                        selected_item_name = selected_item_str.split(' (NT$')[0]
-                        
-                        selected_item_price = store_menu.loc[store_menu['便當品項'] == selected_item_name, '價格'].iloc[0]
-
-                        try:
-                            save_new_order_to_db(name, today_store_name, selected_item_name, selected_item_price)
-                            st.success(f"🎉 訂單已送出！**{name}**，您點了 **{selected_item_name}**，價格 **NT$ {selected_item_price}**。")
-                        except Exception as e:
-                            st.error(f"送出訂單時發生錯誤: {e}")
+        st.subheader("點餐")
+
+        # 每張訂單一個提交代碼，連點或重新執行時不會重複建立訂單
+        if "order_token" not in st.session_state:
+            st.session_state.order_token = new_order_token()
+
+        option_index = load_option_index(today_store_name)
+
+        def format_menu_item(item_id):
+            item, price = menu_index[item_id]
+            return f"{item} (NT$ {price})"
+
+        def format_option(option_id):
+            option, extra_price = option_index[option_id]
+            return f"{option} (+NT$ {extra_price})" if extra_price else option
+
+        # 和上次點一樣的品項、選項與份數（以今天的價格）一鍵送出；今天的店家沒有這個品項時不顯示
+        last_order = load_last_order(profile_name) if profile_name else None
+        reorder_id = next(
+            (item_id for item_id, (item, _) in menu_index.items() if last_order and item == last_order['便當品項']), None
+        )
+        reorder_clicked = False
+        if reorder_id is not None:
+            last_options = set((last_order['選項'] or '').split('、'))
+            reorder_options = [option_id for option_id, (option, _) in option_index.items() if option in last_options]
+            reorder_quantity = last_order['數量'] or 1
+            reorder_label = menu_index[reorder_id][0]
+            if reorder_options:
+                reorder_label += f"（{'、'.join(option_index[option_id][0] for option_id in reorder_options)}）"
+            reorder_clicked = st.button(f"🔁 和上次一樣：{reorder_label} × {reorder_quantity}")
+            if reorder_clicked:
+                place_order(profile_name, today_store_name, selected_session_id, menu_index, reorder_id,
+                            option_index, reorder_options, reorder_quantity)
+
+        with st.form("lunch_order_form"):
+            name = st.text_input("您的姓名", key="order_name")
+            
+            selected_item_id = st.selectbox(
+                "選擇便當品項", options=list(menu_index), format_func=format_menu_item, key="order_item"
+            )
+            selected_option_ids = st.multiselect(
+                "加點選項", options=list(option_index), format_func=format_option, key="order_options"
+            ) if option_index else []
+            quantity = st.number_input("數量", min_value=1, max_value=ORDER_MAX_QUANTITY, value=1, step=1, key="order_quantity")
+            
+            submitted = st.form_submit_button("送出訂單")
+            
+            if submitted:
+                if not name:
+                    st.error("請輸入您的姓名。")
+                else:
+                    place_order(name, today_store_name, selected_session_id, menu_index, selected_item_id,
+                                option_index, selected_option_ids, int(quantity))
+
+        # 送出後要等到一次沒有送出的執行才換新的提交代碼：寫入較慢時排隊的第二次點擊仍帶著同一個代碼，會得到重複送出
+        if not (submitted or reorder_clicked) and "order_token_order" in st.session_state:
+            st.session_state.order_token = new_order_token()
+            del st.session_state.order_token_order
+
+    # --- 我的訂單 ---
+    if profile_name:
+        with st.expander(f"📒 {profile_name} 的本月訂單"):
+            month_orders = load_user_month_orders(profile_name)
+            if not month_orders:
+                st.write("本月還沒有訂單。")
+            else:
+                unpaid_total = sum(order['小計'] for order in month_orders if not order['已付款'])
+                col_count, col_unpaid = st.columns(2)
+                col_count.metric("本月訂單", f"{len(month_orders)} 筆")
+                col_unpaid.metric("尚未付款", f"NT$ {unpaid_total}")
+                st.dataframe(month_orders, hide_index=True)
+
+record_call("rerun:LunchApp", (perf_counter() - rerun_started) * 1000)
@@ -0,0 +1,261 @@
+"""點餐 JSON API：與 Streamlit 介面共用 utils 的資料層，供聊天機器人等自動化程式使用
+
+    GET  /menu/today        今日開放中的場次與菜單（支援 ETag / If-None-Match）
+    POST /orders            送出訂單，截止時間與重複送出的檢查與表單相同
+    GET  /orders/summary    訂單彙總與品項統計（可加 ?session_id=）
+    GET  /metrics           Prometheus 格式的效能監測數據
+
+所有路徑都可加 ?tenant=<租戶代號>。
+
+用法：python api.py [--host 127.0.0.1] [--port 8502]
+"""
+import argparse
+import hashlib
+import json
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from urllib.parse import urlsplit, parse_qs
+
+from utils import (
+    load_menu_snapshot, submit_order, fetch_order_summary, fetch_item_counts, metrics_to_prometheus,
+    ensure_scheduler, use_tenant, current_tenant, record_call,
+    ORDER_CREATED, ORDER_DUPLICATE, ORDER_CLOSED, ORDER_UNAVAILABLE, ORDER_MAX_QUANTITY
+)
+
+# 訂單 JSON 最大長度（位元組）與姓名長度上限
+MAX_BODY_BYTES = 16 * 1024
+MAX_NAME_LENGTH = 50
+
+ORDER_RESULT_STATUS = {
+    ORDER_CREATED: HTTPStatus.CREATED,
+    ORDER_DUPLICATE: HTTPStatus.OK,
+    ORDER_CLOSED: HTTPStatus.CONFLICT,
+    ORDER_UNAVAILABLE: HTTPStatus.UNPROCESSABLE_ENTITY,
+}
+
+
+class ApiError(Exception):
+    """以指定的 HTTP 狀態碼回應錯誤訊息"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# --- 回應內容 ---
+
+_menu_body_lock = threading.Lock()
+_menu_bodies = {}
+
+
+def menu_today_body():
+    """回傳今日菜單快照的 JSON 與 ETag；快照沒有變動時重用上次序列化的結果"""
+    tenant_id = current_tenant()
+    snapshot = load_menu_snapshot()
+    with _menu_body_lock:
+        entry = _menu_bodies.get(tenant_id)
+    if entry is not None and entry[0] is snapshot:
+        return entry[1], entry[2]
+    body = json.dumps(snapshot, ensure_ascii=False).encode('utf-8')
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    with _menu_body_lock:
+        _menu_bodies[tenant_id] = (snapshot, body, etag)
+    return body, etag
+
+
+def _json_int(value, field):
+    """檢查 JSON 整數欄位；true / false、小數與字串都不接受，避免 int() 悄悄轉換成別的 id"""
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{field} 必須是整數")
+    return value
+
+
+def parse_order(payload):
+    """檢查 POST /orders 的內容，回傳 submit_order 的參數"""
+    if not isinstance(payload, dict):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "內容必須是 JSON 物件")
+    name = payload.get('name')
+    if not isinstance(name, str) or not name.strip() or len(name.strip()) > MAX_NAME_LENGTH:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"name 必須是 1 ~ {MAX_NAME_LENGTH} 個字的字串")
+    item_id = _json_int(payload.get('item_id'), 'item_id')
+    session_id = _json_int(payload['session_id'], 'session_id') if payload.get('session_id') is not None else None
+    quantity = _json_int(payload.get('quantity', 1), 'quantity')
+    option_ids = payload.get('option_ids')
+    if option_ids is None:
+        option_ids = []
+    if not isinstance(option_ids, list):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "option_ids 必須是整數陣列")
+    option_ids = [_json_int(option_id, 'option_ids 的每一項') for option_id in option_ids]
+    if not 1 <= quantity <= ORDER_MAX_QUANTITY:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"quantity 必須介於 1 ~ {ORDER_MAX_QUANTITY}")
+    token = payload.get('token')
+    if token is not None and (not isinstance(token, str) or not 1 <= len(token) <= 64):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "token 必須是 1 ~ 64 個字的字串")
+    return {
+        'name': name.strip(), 'item_id': item_id, 'session_id': session_id,
+        'quantity': quantity, 'option_ids': option_ids, 'token': token,
+    }
+
+
+def default_session_id(item_id):
+    """未指定場次時，使用今天開放中、且有這個品項的場次（預設場次優先）"""
+    sessions = sorted(load_menu_snapshot()['場次'], key=lambda session: not session['預設'])
+    for session in sessions:
+        if any(item['id'] == item_id for item in session['品項']):
+            return session['id']
+    return None
+
+
+# --- HTTP ---
+
+class LunchApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'LunchAPI/1.0'
+    # 標頭與內容分兩次寫出，開著 Nagle 演算法時 keep-alive 連線每個回應都會多等約 40ms 的延遲 ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._handle({
+            '/menu/today': self._get_menu_today,
+            '/orders/summary': self._get_orders_summary,
+            '/metrics': self._get_metrics,
+        })
+
+    def do_POST(self):
+        self._handle({'/orders': self._post_order})
+
+    def _handle(self, routes):
+        url = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip('/') or '/'
+        handler = routes.get(path)
+        self.route = path if handler else 'unknown'
+        try:
+            try:
+                use_tenant(self.query.get('tenant', ''))
+            except ValueError as e:
+                raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+            if handler is None:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"找不到 {url.path}")
+            handler()
+        except ApiError as e:
+            self._send_json(e.status, {'error': str(e)})
+        except Exception as e:
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"伺服器錯誤：{e}"})
+
+    def _get_menu_today(self):
+        body, etag = menu_today_body()
+        if etag in (self.headers.get('If-None-Match') or ''):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._send_body(HTTPStatus.OK, body, 'application/json; charset=utf-8', {'ETag': etag, 'Cache-Control': 'no-cache'})
+
+    def _get_orders_summary(self):
+        try:
+            session_id = int(self.query['session_id']) if self.query.get('session_id') else None
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "session_id 必須是整數")
+        self._send_json(HTTPStatus.OK, {
+            '彙總': fetch_order_summary(session_id),
+            '品項統計': fetch_item_counts(session_id),
+        })
+
+    def _get_metrics(self):
+        self._send_body(HTTPStatus.OK, metrics_to_prometheus().encode('utf-8'), 'text/plain; version=0.0.4')
+
+    def _post_order(self):
+        # 長度不合法時不讀取內容，連線上會留下未讀的資料，回應後直接關閉連線
+        self.close_connection = True
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Content-Length 必須是整數")
+        if length < 0:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Content-Length 不可為負數")
+        if length > MAX_BODY_BYTES:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "內容過大")
+        body = self.rfile.read(length)
+        self.close_connection = False
+        try:
+            payload = json.loads(body or b'null')
+        except (ValueError, UnicodeDecodeError):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "內容不是合法的 JSON")
+        order = parse_order(payload)
+        # 也接受 Idempotency-Key 標頭作為提交代碼，重送同一筆訂單不會重複建立
+        order['token'] = order['token'] or self.headers.get('Idempotency-Key')
+        if order['session_id'] is None:
+            order['session_id'] = default_session_id(order['item_id'])
+            if order['session_id'] is None:
+                if not load_menu_snapshot()['場次']:
+                    raise ApiError(HTTPStatus.CONFLICT, "今天沒有開放中的場次")
+                # 有開放中的場次但都沒有這個品項：與指定場次時送出不存在的品項相同
+                self._send_json(ORDER_RESULT_STATUS[ORDER_UNAVAILABLE], {'result': ORDER_UNAVAILABLE, 'session_id': None})
+                return
+
+        result = submit_order(
+            order['name'], None,
+            item_id=order['item_id'],
+            option_ids=order['option_ids'],
+            quantity=order['quantity'],
+            token=order['token'],
+            session_id=order['session_id']
+        )
+        self._send_json(ORDER_RESULT_STATUS[result], {'result': result, 'session_id': order['session_id']})
+
+    def _send_json(self, status, data):
+        self._send_body(status, json.dumps(data, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8')
+
+    def _send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def parse_request(self):
+        self._started = perf_counter()
+        return super().parse_request()
+
+    def log_request(self, code='-', size='-'):
+        # 不逐筆寫存取紀錄，改把每個請求的耗時記在效能監測中
+        elapsed_ms = (perf_counter() - getattr(self, '_started', perf_counter())) * 1000
+        record_call(f"api:{self.command} {getattr(self, 'route', 'unknown')}", elapsed_ms, error=str(code).startswith('5'))
+
+
+class LunchApiServer(ThreadingHTTPServer):
+    """每個連線一條執行緒；預設的 listen 佇列只有 5，大量用戶端同時連線時會等 SYN 重送"""
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def make_server(host='127.0.0.1', port=8502):
+    """建立 API 伺服器並啟動背景排程"""
+    ensure_scheduler()
+    return LunchApiServer((host, port), LunchApiHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="點餐 JSON API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port)
+    print(f"點餐 API 已啟動：http://{args.host}:{args.port}/menu/today")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""效能測試共用工具：建立暫存資料庫、載入 utils 與建立測試用店家"""
+import os
+import sys
+import tempfile
+from datetime import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+
+STORE_NAME = '測試便當'
+
+
+def setup_temp_db():
+    """將 LUNCH_DB_PATH 指向暫存目錄，回傳資料庫路徑（須在匯入 utils 前呼叫）"""
+    tmp_dir = tempfile.mkdtemp(prefix='lunch_bench_')
+    db_path = os.path.join(tmp_dir, 'lunch_orders.db')
+    os.environ['LUNCH_DB_PATH'] = db_path
+    # 背景排程會在量測期間封存或 VACUUM，干擾結果
+    os.environ.setdefault('LUNCH_SCHEDULER', '0')
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    return db_path
+
+
+def seed_store(store_name=STORE_NAME, items=20, address='', phone=''):
+    """建立有 items 個品項（品項0 起、價格 80 起）的店家，設為今日店家並開放訂餐到 23:59"""
+    import pandas as pd
+    import utils
+
+    utils.save_store_menu(store_name, address, phone, pd.DataFrame({
+        '便當品項': [f'品項{i}' for i in range(items)],
+        '價格': [80 + i for i in range(items)],
+    }))
+    utils.save_store_config(store_name)
+    utils.save_cutoff_time(time(23, 59))
+    utils.ensure_default_session()
+
+
+def percentile(samples, pct):
+    """回傳樣本的百分位數（最近序位法）"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[k]
+
+
+def report(label, samples_ms):
+    """印出 p50 / p99 / 最大值（毫秒）"""
+    print(f"{label:<32} n={len(samples_ms):>6}  "
+          f"p50={percentile(samples_ms, 50):8.2f}ms  "
+          f"p99={percentile(samples_ms, 99):8.2f}ms  "
+          f"max={max(samples_ms, default=0):8.2f}ms")
@@ -0,0 +1,94 @@
+"""量測線上備份（與 VACUUM）進行中的下單延遲
+
+先寫入大量歷史訂單讓資料庫有一定大小，再以多條執行緒持續呼叫 submit_order，
+分別量測：沒有維護工作、分段線上備份（預設頁數與暫停）、一次複製完的線上備份，以及 VACUUM。
+
+用法：python benchmarks/bench_backup.py [歷史訂單數] [下單執行緒數]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time as _time
+
+from _common import setup_temp_db, seed_store, report, STORE_NAME
+
+setup_temp_db()
+
+import utils  # noqa: E402
+
+IDLE_SECONDS = 3
+
+
+def seed(archived):
+    seed_store()
+    with utils.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO orders_archive (姓名, 店家名稱, 便當品項, 價格, 數量, 備註, 時間, 已付款, 選取, 刪除, 日期) "
+            "VALUES (?, ?, ?, ?, 1, ?, ?, 1, 0, 0, ?)",
+            ((f'使用者{i % 300}', STORE_NAME, f'品項{i % 20}', 80 + i % 20, '不要辣' * (i % 5),
+              f'2025-{1 + i % 12:02d}-{1 + i % 28:02d} 11:{i % 60:02d}:00', f'2025-{1 + i % 12:02d}-{1 + i % 28:02d}')
+             for i in range(archived))
+        )
+    utils.compact_database()
+
+
+def submit_while(job, writers):
+    """執行 job 的同時讓 writers 條執行緒持續下單，回傳 (下單延遲, job 耗時毫秒, job 結果)"""
+    samples = []
+    done = threading.Event()
+
+    def writer(no):
+        n = 0
+        while not done.is_set():
+            start = _time.perf_counter()
+            utils.submit_order(f'壓測{no}-{n}', STORE_NAME, f'品項{n % 20}', 80 + n % 20)
+            samples.append((_time.perf_counter() - start) * 1000)
+            n += 1
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    start = _time.perf_counter()
+    try:
+        result = job()
+    finally:
+        elapsed = (_time.perf_counter() - start) * 1000
+        done.set()
+        for t in threads:
+            t.join()
+    return samples, elapsed, result
+
+
+def main():
+    archived = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    seed(archived)
+    stats = utils.database_stats()
+    print(f"資料庫 {stats['檔案大小'] / 1024 / 1024:.1f} MB，{stats['頁數']} 頁；{writers} 條執行緒持續下單")
+    out_dir = tempfile.mkdtemp(prefix='lunch_backup_')
+
+    jobs = (
+        ('沒有維護工作', lambda: _time.sleep(IDLE_SECONDS)),
+        (f'分段備份 {utils.BACKUP_PAGES} 頁/步',
+         lambda: utils.backup_database(os.path.join(out_dir, 'paged.db'))),
+        ('一次複製完的備份',
+         lambda: utils.backup_database(os.path.join(out_dir, 'single.db'), pages=-1, pause=0)),
+        ('VACUUM', lambda: utils.compact_database(min_free_ratio=0)),
+    )
+    for label, job in jobs:
+        samples, elapsed, result = submit_while(job, writers)
+        report(f'{label}（{elapsed:.0f}ms）', samples)
+        if isinstance(result, str):
+            with utils.get_connection() as conn:
+                live = conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+            import sqlite3
+            backup = sqlite3.connect(result)
+            copied = backup.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+            backup.close()
+            print(f"{'':<4}備份中的今日訂單 {copied} 筆（備份結束時資料庫已有 {live} 筆，之後的訂單不在這份快照中）")
+
+
+if __name__ == '__main__':
+    main()
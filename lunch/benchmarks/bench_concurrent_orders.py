@@ -0,0 +1,76 @@
+"""模擬多個 Streamlit 工作階段同時載入頁面並透過 submit_order() 送出訂單
+
+每個工作階段的第 5、10… 筆會再送一次上一筆的提交代碼（模擬連點），應該得到 ORDER_DUPLICATE。
+
+用法：python benchmarks/bench_concurrent_orders.py [工作階段數] [每階段訂單數]
+"""
+import sys
+import threading
+import time as _time
+from collections import Counter
+
+from _common import setup_temp_db, seed_store, report
+
+setup_temp_db()
+
+import utils  # noqa: E402
+
+
+def session_worker(session_no, orders_per_session, barrier, render_ms, submit_ms, results, errors):
+    barrier.wait()
+    token = None
+    for n in range(orders_per_session):
+        try:
+            start = _time.perf_counter()
+            session = utils.load_open_sessions()[0]
+            store_name = session['店家名稱']
+            utils.load_store(store_name)
+            item_ids = list(utils.load_menu_index(store_name))
+            utils.load_option_index(store_name)
+            render_ms.append((_time.perf_counter() - start) * 1000)
+
+            if token is None or n % 5 != 4:
+                token = utils.new_order_token()
+            start = _time.perf_counter()
+            result = utils.submit_order(f'使用者{session_no}', None, item_id=item_ids[n % len(item_ids)],
+                                        session_id=session['id'], token=token)
+            submit_ms.append((_time.perf_counter() - start) * 1000)
+            results.append(result)
+        except Exception as e:  # 記錄 "database is locked" 等錯誤
+            errors.append(repr(e))
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    orders_per_session = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    seed_store()
+    barrier = threading.Barrier(sessions)
+    render_ms, submit_ms, results, errors = [], [], [], []
+    threads = [
+        threading.Thread(target=session_worker,
+                         args=(i, orders_per_session, barrier, render_ms, submit_ms, results, errors))
+        for i in range(sessions)
+    ]
+
+    start = _time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = _time.perf_counter() - start
+
+    counts = Counter(results)
+    expected = counts[utils.ORDER_CREATED]
+    saved = len(utils.load_orders_from_db())
+    print(f"{sessions} 個工作階段 × {orders_per_session} 筆訂單，耗時 {elapsed:.2f}s")
+    report('頁面載入 (場次 + 店家菜單)', render_ms)
+    report('送出訂單 (submit_order)', submit_ms)
+    print(f"新增 {expected} 筆、重複送出 {counts[utils.ORDER_DUPLICATE]} 筆（預期 {sessions * (orders_per_session // 5)} 筆），"
+          f"實際寫入 {saved} 筆，錯誤 {len(errors)} 次")
+    for err in sorted(set(errors))[:5]:
+        print('  ', err)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""比較訂單表格成長時，管理頁面單一勾選變動的寫入延遲
+
+用法：python benchmarks/bench_order_edits.py [重複次數]
+"""
+import sys
+import time as _time
+
+from _common import setup_temp_db, report
+
+setup_temp_db()
+
+import utils  # noqa: E402
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+def seed_orders(total):
+    with utils.transaction() as conn:
+        conn.execute("DELETE FROM orders")
+        conn.executemany(
+            "INSERT INTO orders (姓名, 店家名稱, 便當品項, 價格, 數量, 備註, 時間, 已付款, 選取, 刪除) "
+            "VALUES (?, ?, ?, ?, 1, '', ?, 0, 0, 0)",
+            ((f'使用者{i % 300}', '測試便當', f'品項{i % 20}', 80 + i % 20,
+              f'2025-01-01 07:{i % 60:02d}:00') for i in range(total))
+        )
+        return [row[0] for row in conn.execute("SELECT id FROM orders")]
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    for size in SIZES:
+        ids = seed_orders(size)
+        samples = []
+        for n in range(repeat):
+            order_id = ids[(n * 7919) % len(ids)]
+            start = _time.perf_counter()
+            utils.apply_order_changes({order_id: {'已付款': n % 2 == 0}})
+            samples.append((_time.perf_counter() - start) * 1000)
+        report(f'勾選已付款 ({size:,} 筆訂單)', samples)
+
+
+if __name__ == '__main__':
+    main()
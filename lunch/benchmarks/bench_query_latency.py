@@ -0,0 +1,83 @@
+"""在一年份的模擬訂單上量測熱門查詢的延遲，並比較有無索引的差異
+
+用法：python benchmarks/bench_query_latency.py [每日訂單數]
+"""
+import sys
+import time as _time
+from datetime import date, timedelta
+
+from _common import setup_temp_db, report
+
+setup_temp_db()
+
+import utils  # noqa: E402
+
+INDEXES = {
+    'idx_orders_name_time': "CREATE INDEX idx_orders_name_time ON orders (姓名, 時間)",
+    'idx_orders_time': "CREATE INDEX idx_orders_time ON orders (時間)",
+    'idx_orders_date': "CREATE INDEX idx_orders_date ON orders (日期)",
+}
+
+QUERIES = {
+    '依姓名計數 (fetch_order_count)': ("SELECT COUNT(*) FROM orders WHERE 姓名 = ?", ('使用者42',)),
+    '單日訂單 (日期)': ("SELECT * FROM orders WHERE 日期 = ?", ('2025-06-16',)),
+    '時段訂單 (時間 範圍)': ("SELECT * FROM orders WHERE 時間 BETWEEN ? AND ?",
+                        ('2025-06-16 07:00:00', '2025-06-16 08:00:00')),
+    '單一店家菜單 (store_id)': ("SELECT m.* FROM menu_items m JOIN stores s ON s.id = m.store_id "
+                             "WHERE s.店家名稱 = ?", ('店家7',)),
+}
+
+
+def seed(orders_per_day):
+    start = date(2025, 1, 1)
+    with utils.transaction() as conn:
+        conn.executemany("INSERT INTO stores (店家名稱) VALUES (?)", ((f'店家{s}',) for s in range(200)))
+        conn.executemany(
+            "INSERT INTO menu_items (store_id, 便當品項, 價格) "
+            "SELECT id, ?, ? FROM stores WHERE 店家名稱 = ?",
+            ((f'品項{i}', 80 + i, f'店家{s}') for s in range(200) for i in range(50))
+        )
+        rows = []
+        for day in range(365):
+            day_str = (start + timedelta(days=day)).isoformat()
+            for n in range(orders_per_day):
+                rows.append((f'使用者{n % 300}', f'店家{day % 200}', f'品項{n % 50}', 80 + n % 50,
+                             f'{day_str} 07:{n % 60:02d}:00', day_str))
+        conn.executemany(
+            "INSERT INTO orders (姓名, 店家名稱, 便當品項, 價格, 數量, 備註, 時間, 已付款, 選取, 刪除, 日期) "
+            "VALUES (?, ?, ?, ?, 1, '', ?, 0, 0, 0, ?)", rows
+        )
+    return len(rows)
+
+
+def run_queries(label, repeat):
+    with utils.get_connection() as conn:
+        conn.execute("ANALYZE")
+        for name, (sql, params) in QUERIES.items():
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            samples = []
+            for _ in range(repeat):
+                start = _time.perf_counter()
+                conn.execute(sql, params).fetchall()
+                samples.append((_time.perf_counter() - start) * 1000)
+            report(f'[{label}] {name}', samples)
+            print(f"{'':<8}{plan[-1][-1]}")
+
+
+def main():
+    orders_per_day = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    total = seed(orders_per_day)
+    print(f"模擬訂單 {total:,} 筆（365 天 × {orders_per_day} 筆）")
+
+    run_queries('有索引', 50)
+    with utils.transaction() as conn:
+        for index_name in INDEXES:
+            conn.execute(f"DROP INDEX {index_name}")
+    run_queries('無索引', 10)
+    with utils.transaction() as conn:
+        for create_sql in INDEXES.values():
+            conn.execute(create_sql)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""量測冷啟動：每次都在新的 Python 行程中匯入 utils，並以 AppTest 執行第一次頁面
+
+import 時間取自 `python -X importtime` 的累計值；第一次執行包含匯入、資料庫初始化與第一次查詢。
+
+用法：python benchmarks/bench_startup.py [重複次數]
+"""
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+from _common import APP_DIR, BENCH_DIR, report
+
+# 在子行程中執行：建立有菜單與今日店家的資料庫，之後另開行程量測第一次執行
+SEED_SCRIPT = '''
+import sys
+sys.path[:0] = [{app_dir!r}, {bench_dir!r}]
+from _common import seed_store
+seed_store('店家0', items=50, address='地址', phone='02-0000-0000')
+'''
+
+FIRST_RENDER_SCRIPT = '''
+import logging
+import sys
+import time
+logging.disable(logging.WARNING)
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({page!r}, default_timeout=60)
+app.run()
+elapsed = (time.perf_counter() - start) * 1000
+if app.exception:
+    raise SystemExit(app.exception[0].value)
+print(elapsed)
+'''
+
+
+def import_time_ms(env):
+    """回傳 `import utils` 的累計匯入時間（毫秒）"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import sys; sys.path.insert(0, {APP_DIR!r}); import utils'],
+        env=env, capture_output=True, text=True, check=True
+    )
+    match = re.search(r'\|\s*(\d+)\s*\|\s*utils\s*$', result.stderr, re.MULTILINE)
+    return int(match.group(1)) / 1000
+
+
+def first_render_ms(env, page):
+    result = subprocess.run(
+        [sys.executable, '-c', FIRST_RENDER_SCRIPT.format(page=page)],
+        env=env, capture_output=True, text=True, check=True, cwd=APP_DIR
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    env = dict(os.environ, LUNCH_DB_PATH=os.path.join(tempfile.mkdtemp(prefix='lunch_bench_'), 'lunch_orders.db'))
+    subprocess.run([sys.executable, '-c', SEED_SCRIPT.format(app_dir=APP_DIR, bench_dir=BENCH_DIR)], env=env, check=True)
+
+    report('import utils', [import_time_ms(env) for _ in range(repeat)])
+    for page in ('LunchApp.py', os.path.join('pages', 'admin.py')):
+        report(f'第一次執行 {page}', [first_render_ms(env, os.path.join(APP_DIR, page)) for _ in range(repeat)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""點餐熱門路徑的效能測試套件：直接呼叫 utils 與透過 AppTest 執行頁面，並與基準值比較
+
+每個情境回報 p50 / p99 延遲、每次執行的記憶體配置高峰（tracemalloc）與 SQL 語句數，
+合成資料為 10 間店家 × 50 個品項，訂單數分別為 1k / 10k / 100k 筆。
+
+用法：
+    python benchmarks/bench_suite.py                    # 與 baselines.json 比較，有退步時回傳 1
+    python benchmarks/bench_suite.py --save-baseline    # 以這次結果覆寫基準值
+    python benchmarks/bench_suite.py --sizes 1000 --no-apptest
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time as _time
+import tracemalloc
+from datetime import time
+
+from _common import BENCH_DIR, APP_DIR, setup_temp_db, percentile
+
+setup_temp_db()
+
+import pandas as pd  # noqa: E402
+import utils  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baselines.json')
+SIZES = (1_000, 10_000, 100_000)
+STORE_COUNT = 10
+ITEMS_PER_STORE = 50
+TODAY_STORE = '店家0'
+ADMIN_PASSWORD = 'admin603'
+
+# p50 延遲超過基準值的倍數（p99 放寬為兩倍）且差距超過 MIN_DELTA_MS 才算退步，避免極短的情境因雜訊誤判
+DEFAULT_TOLERANCE = 0.5
+MIN_DELTA_MS = 2.0
+ALLOC_TOLERANCE = 0.5
+# 快取每 CACHE_TTL_SECONDS 秒才檢查一次設定版本，平均語句數會因此多出不到一句
+SQL_SLACK = 1
+# 量測配置與 SQL 數時會啟用 tracemalloc，速度較慢，只取幾次
+PROFILE_RUNS = 3
+
+
+# --- 合成資料 ---
+
+def seed_menus():
+    """建立 10 間店家、每間 50 個品項，並設定今日店家與截止時間"""
+    for s in range(STORE_COUNT):
+        items = pd.DataFrame({
+            '便當品項': [f'品項{i}' for i in range(ITEMS_PER_STORE)],
+            '價格': [80 + i for i in range(ITEMS_PER_STORE)],
+        })
+        utils.save_store_menu(f'店家{s}', f'地址{s}', f'02-0000-00{s:02d}', items)
+    utils.save_store_config(TODAY_STORE)
+    utils.save_cutoff_time(time(23, 59))
+    utils.ensure_default_session()
+
+
+def seed_orders(total):
+    """清空訂單後寫入 total 筆今天的訂單，全部掛在今日預設場次下"""
+    today = utils.now_tw().strftime("%Y-%m-%d")
+    session_id = next(s['id'] for s in utils.load_sessions() if s['預設'])
+    with utils.transaction() as conn:
+        conn.execute("DELETE FROM orders")
+        conn.executemany(
+            "INSERT INTO orders (姓名, 店家名稱, 便當品項, 價格, 數量, 備註, 時間, 已付款, 選取, 刪除, 日期, session_id) "
+            "VALUES (?, ?, ?, ?, 1, '', ?, 0, 0, 0, ?, ?)",
+            ((f'使用者{i % 300}', TODAY_STORE, f'品項{i % ITEMS_PER_STORE}', 80 + i % ITEMS_PER_STORE,
+              f'{today} {8 + i % 4:02d}:{i % 60:02d}:00', today, session_id) for i in range(total))
+        )
+
+
+# --- 情境 ---
+
+def scenario_menu_options():
+    """LunchApp 每次重新執行時取得菜單索引並組出下拉選單的顯示文字"""
+    def run():
+        menu_index = utils.load_menu_index(TODAY_STORE)
+        [f"{item} (NT$ {price})" for item, price in menu_index.values()]
+    return run
+
+
+def scenario_submit_order():
+    """點餐頁面送出訂單：以品項 id、預設場次與新的提交代碼經由批次寫入"""
+    item_id = next(iter(utils.load_menu_index(TODAY_STORE)))
+    session_id = next(s['id'] for s in utils.load_sessions() if s['預設'])
+
+    def run():
+        utils.submit_order('壓測', None, item_id=item_id, session_id=session_id, token=utils.new_order_token())
+    return run
+
+
+def scenario_admin_orders_page():
+    """訂單總覽的分頁查詢：只看未付款、依時間新到舊的第一頁"""
+    def run():
+        utils.load_orders_page(0, 50, unpaid_only=True, descending=True)
+    return run
+
+
+def scenario_admin_autosave():
+    """在訂單總覽勾選一筆已付款後的自動儲存"""
+    orders_df = utils.load_orders_page(0, 50)[0]
+    state = {'n': 0}
+
+    def run():
+        state['n'] += 1
+        row = (state['n'] * 7919) % len(orders_df)
+        changes = utils.collect_order_changes(orders_df, {row: {'已付款': state['n'] % 2 == 0}})
+        utils.apply_order_changes(changes)
+    return run
+
+
+def scenario_order_summary():
+    def run():
+        utils.fetch_order_summary()
+    return run
+
+
+def scenario_apptest_lunchapp():
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(os.path.join(APP_DIR, 'LunchApp.py'), default_timeout=120)
+    app.run()
+
+    def run():
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+    return run
+
+
+def scenario_apptest_admin():
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(os.path.join(APP_DIR, 'pages', 'admin.py'), default_timeout=120)
+    app.run()
+    app.text_input(key='login_password').input(ADMIN_PASSWORD).run()
+
+    def run():
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+    return run
+
+
+DIRECT_SCENARIOS = {
+    'menu_options': scenario_menu_options,
+    'submit_order': scenario_submit_order,
+    'admin_orders_page': scenario_admin_orders_page,
+    'admin_autosave': scenario_admin_autosave,
+    'order_summary': scenario_order_summary,
+}
+
+APPTEST_SCENARIOS = {
+    'apptest_lunchapp': scenario_apptest_lunchapp,
+    'apptest_admin': scenario_apptest_admin,
+}
+
+
+# --- 量測 ---
+
+def measure(run, repeat):
+    """先量測延遲，再啟用 tracemalloc 與 SQL 追蹤量測每次執行的配置高峰與語句數"""
+    run()
+    samples = []
+    for _ in range(repeat):
+        start = _time.perf_counter()
+        run()
+        samples.append((_time.perf_counter() - start) * 1000)
+
+    statements = []
+    peaks = []
+    utils.set_sql_trace(statements.append)
+    tracemalloc.start()
+    try:
+        for _ in range(PROFILE_RUNS):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            run()
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+        utils.set_sql_trace(None)
+
+    return {
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'alloc_kb': round(max(peaks) / 1024, 1),
+        'sql': round(len(statements) / PROFILE_RUNS, 1),
+    }
+
+
+def compare(key, result, baseline, tolerance):
+    """回傳與基準值相比的退步項目"""
+    if not baseline:
+        return []
+    problems = []
+    for metric, scale in (('p50_ms', 1), ('p99_ms', 2)):
+        limit = baseline[metric] * (1 + tolerance * scale)
+        if result[metric] > limit and result[metric] - baseline[metric] > MIN_DELTA_MS:
+            problems.append(f"{key} {metric} {baseline[metric]} → {result[metric]}")
+    if result['alloc_kb'] > baseline['alloc_kb'] * (1 + ALLOC_TOLERANCE) + 64:
+        problems.append(f"{key} alloc_kb {baseline['alloc_kb']} → {result['alloc_kb']}")
+    if result['sql'] > baseline['sql'] + SQL_SLACK:
+        problems.append(f"{key} sql {baseline['sql']} → {result['sql']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='訂單筆數')
+    parser.add_argument('--repeat', type=int, default=30, help='直接呼叫情境的重複次數')
+    parser.add_argument('--apptest-repeat', type=int, default=5, help='AppTest 情境的重複次數')
+    parser.add_argument('--no-apptest', action='store_true', help='略過 AppTest 情境')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='延遲允許的退步比例')
+    parser.add_argument('--save-baseline', action='store_true', help='將這次結果寫入 baselines.json')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding='utf-8') as f:
+            baselines = json.load(f)
+
+    scenarios = dict(DIRECT_SCENARIOS)
+    if not args.no_apptest:
+        scenarios.update(APPTEST_SCENARIOS)
+
+    seed_menus()
+    results = {}
+    problems = []
+    print(f"{'情境':<28}{'p50(ms)':>10}{'p99(ms)':>10}{'配置(KB)':>11}{'SQL':>7}")
+    for size in args.sizes:
+        seed_orders(size)
+        print(f"--- {size:,} 筆訂單 ---")
+        for name, factory in scenarios.items():
+            repeat = args.apptest_repeat if name in APPTEST_SCENARIOS else args.repeat
+            key = f"{name}@{size}"
+            result = results[key] = measure(factory(), repeat)
+            print(f"{name:<30}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                  f"{result['alloc_kb']:>11.1f}{result['sql']:>7.1f}")
+            problems += compare(key, result, baselines.get(key), args.tolerance)
+
+    if args.save_baseline:
+        baselines.update(results)
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"已更新基準值：{BASELINE_PATH}")
+    elif problems:
+        print("\n與基準值相比有退步：")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    elif baselines:
+        print("\n與基準值相比沒有退步。")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""對點餐 JSON API 做壓力測試：在同一行程啟動 api.py 的伺服器，多個用戶端以 keep-alive 連線同時送出請求
+
+每個用戶端依序執行：GET /menu/today（第一次取得 ETag，之後帶 If-None-Match 應得到 304）、
+POST /orders 送出一筆訂單、GET /orders/summary。
+
+用法：python benchmarks/load_api.py [用戶端數] [每個用戶端的回合數]
+"""
+import http.client
+import json
+import sys
+import threading
+import time as _time
+from collections import Counter
+
+from _common import setup_temp_db, seed_store, report
+
+setup_temp_db()
+
+import utils  # noqa: E402
+import api  # noqa: E402
+
+def client_worker(port, client_no, rounds, barrier, samples, statuses, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    etag = None
+
+    def request(label, method, path, body=None, headers=None):
+        start = _time.perf_counter()
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        data = response.read()
+        samples[label].append((_time.perf_counter() - start) * 1000)
+        statuses.append(f"{label} {response.status}")
+        return response, data
+
+    barrier.wait()
+    try:
+        for n in range(rounds):
+            if etag is None:
+                response, data = request('GET /menu/today', 'GET', '/menu/today')
+                etag = response.getheader('ETag')
+                item_ids = [item['id'] for item in json.loads(data)['場次'][0]['品項']]
+            else:
+                request('GET /menu/today (304)', 'GET', '/menu/today', headers={'If-None-Match': etag})
+
+            order = {'name': f'機器人{client_no}', 'item_id': item_ids[n % len(item_ids)], 'token': f'{client_no}-{n}'}
+            request('POST /orders', 'POST', '/orders', body=json.dumps(order),
+                    headers={'Content-Type': 'application/json'})
+            request('GET /orders/summary', 'GET', '/orders/summary')
+    except Exception as e:
+        errors.append(repr(e))
+    finally:
+        conn.close()
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    seed_store(items=50)
+    server = api.make_server(port=0)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    labels = ('GET /menu/today', 'GET /menu/today (304)', 'POST /orders', 'GET /orders/summary')
+    samples = {label: [] for label in labels}
+    statuses = []
+    errors = []
+    barrier = threading.Barrier(clients)
+    threads = [
+        threading.Thread(target=client_worker, args=(port, i, rounds, barrier, samples, statuses, errors))
+        for i in range(clients)
+    ]
+
+    start = _time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = _time.perf_counter() - start
+    server.shutdown()
+    server.server_close()
+
+    for label in labels:
+        report(label, samples[label])
+    total = sum(len(values) for values in samples.values())
+    print(f"{clients} 個用戶端 × {rounds} 回合：{total} 個請求，{elapsed:.2f}s，{total / elapsed:.0f} req/s")
+    print("狀態碼：" + "、".join(f"{key}×{count}" for key, count in sorted(Counter(statuses).items())))
+    with utils.get_connection() as conn:
+        print(f"資料庫訂單數：{conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0]}"
+              f"（預期 {clients * rounds}）")
+    if errors:
+        print(f"錯誤 {len(errors)} 次，例如：{errors[0]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""截止前最後一秒的搶單壓力測試：確認訂單不會遺失也不會重複
+
+在截止前 1 秒同時送出大量訂單（部分模擬連點，重複使用同一個提交代碼），
+截止後再送出一批遲到的訂單，最後比對資料庫內容與每個請求拿到的結果。
+
+用法：python benchmarks/load_cutoff_rush.py [同時送出數]
+"""
+import sys
+import threading
+import time as _time
+from datetime import datetime, time, timedelta
+
+from _common import setup_temp_db, report
+
+setup_temp_db()
+
+import utils  # noqa: E402
+
+CUTOFF = time(8, 50)
+
+# 模擬時鐘：測試開始時是截止前 1 秒，之後隨真實時間前進
+_clock_start = _time.monotonic()
+_clock_base = datetime.combine(datetime(2025, 1, 6).date(), CUTOFF) - timedelta(seconds=1)
+utils.now_tw = lambda: _clock_base + timedelta(seconds=_time.monotonic() - _clock_start)
+
+
+def submitter(token, n, barrier, results, latencies, lock):
+    barrier.wait()
+    start = _time.perf_counter()
+    result = utils.submit_order(f'使用者{n}', '測試便當', f'品項{n % 20}', 80 + n % 20, token=token)
+    elapsed = (_time.perf_counter() - start) * 1000
+    with lock:
+        results.append((token, result))
+        latencies.append(elapsed)
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    utils.save_cutoff_time(CUTOFF)
+
+    # 每 5 個請求中有 1 個重複使用前一個代碼，模擬連點
+    tokens = []
+    for n in range(concurrency):
+        tokens.append(tokens[-1] if n % 5 == 4 else utils.new_order_token())
+
+    results, latencies, lock = [], [], threading.Lock()
+    barrier = threading.Barrier(concurrency)
+    threads = [
+        threading.Thread(target=submitter, args=(token, n, barrier, results, latencies, lock))
+        for n, token in enumerate(tokens)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    report(f'截止前送出 ({concurrency} 個請求)', latencies)
+
+    # 等到模擬時鐘超過截止時間，再送出遲到的訂單
+    while utils.now_tw() <= datetime.combine(_clock_base.date(), CUTOFF) + timedelta(seconds=0.5):
+        _time.sleep(0.05)
+    late = [utils.submit_order('遲到的人', '測試便當', '品項0', 80) for _ in range(10)]
+
+    with utils.get_connection() as conn:
+        saved_tokens = [row[0] for row in conn.execute("SELECT 提交代碼 FROM orders")]
+
+    created = {token for token, result in results if result == utils.ORDER_CREATED}
+    duplicates = sum(1 for _, result in results if result == utils.ORDER_DUPLICATE)
+    unique_tokens = set(tokens)
+
+    print(f"不重複代碼 {len(unique_tokens)} 個，寫入 {len(saved_tokens)} 筆，"
+          f"擋下重複 {duplicates} 次，遲到被拒 {late.count(utils.ORDER_CLOSED)} / {len(late)}")
+
+    ok = (
+        len(saved_tokens) == len(set(saved_tokens)) == len(unique_tokens)
+        and created == set(saved_tokens)
+        and duplicates == len(tokens) - len(unique_tokens)
+        and all(result == utils.ORDER_CLOSED for result in late)
+    )
+    print("✅ 沒有遺失或重複的訂單" if ok else "❌ 訂單數量不一致")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
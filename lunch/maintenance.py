@@ -0,0 +1,278 @@
+"""資料庫維護工具：線上備份、完整性檢查、整理（ANALYZE / VACUUM）與舊版檔案匯入
+
+    python maintenance.py backup [--output 路徑] [--pages 256] [--pause 0.002]
+    python maintenance.py check [--full]
+    python maintenance.py compact [--analyze] [--force]
+    python maintenance.py import-legacy [--dir 舊檔所在目錄] [--force]
+    python maintenance.py stats
+    python maintenance.py create-tenant <租戶代號>
+    python maintenance.py export --output 檔名.csv|.xlsx [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--store 店家]
+
+每個指令都可加 --tenant <租戶代號>。備份與整理每天也會由背景排程在凌晨離峰時段（NIGHTLY_MAINTENANCE_TIME ~ NIGHTLY_MAINTENANCE_END）自動執行一次。
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+from datetime import datetime, time, timedelta
+
+from utils import (
+    backup_database, check_integrity, compact_database, database_stats, list_backups, use_tenant,
+    create_tenant, tenant_db_path, get_connection, transaction, upsert_menu_items, load_store_config,
+    save_store_config, save_cutoff_time, now_tw, write_orders_csv, write_orders_xlsx,
+    BACKUP_PAGES, BACKUP_PAUSE_SECONDS, VACUUM_MIN_FREE_RATIO
+)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 改用 SQLite 資料表之前留下的檔案：lunch.db（orders / menus 表）、orders.csv 與兩個設定檔
+LEGACY_DB = 'lunch.db'
+LEGACY_ORDERS_CSV = 'orders.csv'
+LEGACY_STORE_CONFIG = 'store_config.txt'
+LEGACY_CUTOFF_TIME = 'cutoff_time.txt'
+LEGACY_ENCODINGS = ('utf-8-sig', 'cp950')
+# 匯入的舊訂單以「legacy:<來源檔>:<列號>」作為提交代碼，重新匯入時先刪除上次匯入的資料列
+LEGACY_TOKEN_PREFIX = 'legacy:'
+
+# --- 舊版檔案匯入 ---
+
+def _read_legacy_text(path):
+    """讀取舊版文字檔（UTF-8 或 Windows 上存的 Big5），不存在時回傳 None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        raw = f.read()
+    for encoding in LEGACY_ENCODINGS:
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"無法辨識 {path} 的文字編碼")
+
+
+def _file_time(path):
+    """以檔案修改時間（台灣時間）作為沒有時間欄位的舊訂單時間"""
+    return datetime.utcfromtimestamp(os.path.getmtime(path)) + timedelta(hours=8)
+
+
+def _legacy_order(row, stamp, token):
+    """將舊版訂單（姓名, 店家, 便當品項, 價格, 已付款, 備註）轉為 orders_archive 的欄位值"""
+    name = (row.get('姓名') or '').strip()
+    if not name:
+        return None
+    try:
+        price = int(float(row.get('價格') or 0))
+    except (TypeError, ValueError):
+        price = 0
+    paid = str(row.get('已付款') or '').strip().lower() in ('1', '1.0', 'true')
+    return (
+        name, (row.get('店家') or '').strip(), (row.get('便當品項') or '').strip(), price,
+        (row.get('備註') or '').strip(), stamp.strftime('%Y-%m-%d %H:%M:%S'), paid, stamp.strftime('%Y-%m-%d'), token
+    )
+
+
+def _parse_legacy_time(text):
+    """舊版截止時間為 'HH:MM:SS'，格式錯誤時回傳 None"""
+    for fmt in ('%H:%M:%S', '%H:%M'):
+        try:
+            parsed = datetime.strptime(text.strip(), fmt)
+            return time(parsed.hour, parsed.minute)
+        except ValueError:
+            continue
+    return None
+
+
+def read_legacy_files(legacy_dir=APP_DIR):
+    """讀取舊版檔案，回傳 {'menus': {店家: [(品項, 價格)]}, 'orders': [...], 'store': ..., 'cutoff': ...}"""
+    data = {'menus': {}, 'orders': [], 'store': None, 'cutoff': None}
+
+    db_path = os.path.join(legacy_dir, LEGACY_DB)
+    if os.path.exists(db_path):
+        stamp = _file_time(db_path)
+        legacy = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        legacy.row_factory = sqlite3.Row
+        try:
+            tables = {row[0] for row in legacy.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if 'menus' in tables:
+                for row in legacy.execute("SELECT 店家名稱, 便當品項, 價格 FROM menus"):
+                    store, item = (row['店家名稱'] or '').strip(), (row['便當品項'] or '').strip()
+                    # 舊版允許沒有店家的品項，無法歸到任何店家，略過
+                    if store and item:
+                        data['menus'].setdefault(store, []).append((item, int(row['價格'] or 0)))
+            if 'orders' in tables:
+                for n, row in enumerate(legacy.execute("SELECT * FROM orders")):
+                    order = _legacy_order(dict(row), stamp, f'{LEGACY_TOKEN_PREFIX}{LEGACY_DB}:{n}')
+                    if order:
+                        data['orders'].append(order)
+        finally:
+            legacy.close()
+
+    csv_path = os.path.join(legacy_dir, LEGACY_ORDERS_CSV)
+    text = _read_legacy_text(csv_path)
+    if text:
+        stamp = _file_time(csv_path)
+        for n, row in enumerate(csv.DictReader(text.splitlines())):
+            order = _legacy_order(row, stamp, f'{LEGACY_TOKEN_PREFIX}{LEGACY_ORDERS_CSV}:{n}')
+            if order:
+                data['orders'].append(order)
+
+    text = _read_legacy_text(os.path.join(legacy_dir, LEGACY_STORE_CONFIG))
+    if text and text.strip():
+        data['store'] = text.strip()
+
+    text = _read_legacy_text(os.path.join(legacy_dir, LEGACY_CUTOFF_TIME))
+    if text and text.strip():
+        data['cutoff'] = _parse_legacy_time(text)
+    return data
+
+
+def _reserve_order_ids(conn, count):
+    """從 orders 的 AUTOINCREMENT 計數器保留 count 個 id，回傳第一個
+
+    每日封存會把 orders.id 原樣複製到 orders_archive，匯入的舊訂單若用 orders_archive 自己的計數器，
+    之後封存時就會撞到相同的 id。
+    """
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'orders'").fetchone()
+    start = max(
+        seq[0] if seq else 0,
+        conn.execute("SELECT COALESCE(MAX(id), 0) FROM orders").fetchone()[0],
+        conn.execute("SELECT COALESCE(MAX(id), 0) FROM orders_archive").fetchone()[0],
+    ) + 1
+    if seq:
+        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'orders'", (start + count - 1,))
+    else:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('orders', ?)", (start + count - 1,))
+    return start
+
+
+def import_legacy_files(legacy_dir=APP_DIR, force=False):
+    """將舊版檔案匯入目前租戶的資料庫，回傳匯入摘要；已匯入過時不做任何事（force 時重新匯入）
+
+    菜單以 upsert 合併到現有店家；舊訂單沒有日期，以檔案修改時間放進歷史訂單，
+    重新匯入時會取代上次匯入的舊訂單而不會重複；今日店家與截止時間只在資料庫尚未設定時才採用舊設定。
+    """
+    with get_connection() as conn:
+        done = conn.execute("SELECT value FROM config WHERE key = 'legacy_import_date'").fetchone()
+    if done and not force:
+        return None
+
+    data = read_legacy_files(legacy_dir)
+    import pandas as pd
+    for store, items in data['menus'].items():
+        upsert_menu_items(store, pd.DataFrame(items, columns=['便當品項', '價格']).drop_duplicates('便當品項', keep='last'))
+
+    with transaction() as conn:
+        conn.execute("DELETE FROM orders_archive WHERE substr(提交代碼, 1, ?) = ?",
+                     (len(LEGACY_TOKEN_PREFIX), LEGACY_TOKEN_PREFIX))
+        start = _reserve_order_ids(conn, len(data['orders']))
+        conn.executemany(
+            "INSERT INTO orders_archive (id, 姓名, 店家名稱, 便當品項, 價格, 數量, 備註, 時間, 已付款, 選取, 刪除, 日期, 提交代碼) "
+            "VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, 0, 0, ?, ?)",
+            [(start + n, *order) for n, order in enumerate(data['orders'])]
+        )
+        conn.execute(
+            "REPLACE INTO config (key, value) VALUES ('legacy_import_date', ?)",
+            (now_tw().date().isoformat(),)
+        )
+        has_cutoff = conn.execute("SELECT 1 FROM config WHERE key = 'cutoff_time'").fetchone()
+
+    store_set = bool(data['store']) and not load_store_config()
+    if store_set:
+        save_store_config(data['store'])
+    cutoff_set = data['cutoff'] is not None and not has_cutoff
+    if cutoff_set:
+        save_cutoff_time(data['cutoff'])
+    return {
+        '店家': len(data['menus']),
+        '品項': sum(len(items) for items in data['menus'].values()),
+        '歷史訂單': len(data['orders']),
+        '今日店家': data['store'] if store_set else None,
+        '截止時間': data['cutoff'].strftime('%H:%M') if cutoff_set else None,
+    }
+
+# --- 命令列 ---
+
+def _format_size(size):
+    return f"{size / 1024 / 1024:.1f} MB" if size >= 1024 * 1024 else f"{size / 1024:.1f} KB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="點餐資料庫維護")
+    parser.add_argument('--tenant', default='', help='租戶代號（預設租戶不用填）')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backup = commands.add_parser('backup', help='線上備份（不會擋住點餐）')
+    backup.add_argument('--output', help='備份檔路徑（預設寫到 data/backups 並只保留最新幾份）')
+    backup.add_argument('--pages', type=int, default=BACKUP_PAGES, help='每一步複製的頁數')
+    backup.add_argument('--pause', type=float, default=BACKUP_PAUSE_SECONDS, help='每一步之間暫停的秒數')
+
+    check = commands.add_parser('check', help='完整性檢查')
+    check.add_argument('--full', action='store_true', help='使用較慢的 integrity_check 並檢查外鍵')
+
+    compact = commands.add_parser('compact', help='更新查詢統計並回收可用空間（VACUUM 期間會暫停寫入，請在離峰時執行）')
+    compact.add_argument('--analyze', action='store_true', help='完整執行 ANALYZE')
+    compact.add_argument('--force', action='store_true', help='不論可用頁多少都執行 VACUUM')
+
+    legacy = commands.add_parser('import-legacy', help='匯入舊版 lunch.db / orders.csv / *.txt')
+    legacy.add_argument('--dir', default=APP_DIR, help='舊版檔案所在目錄')
+    legacy.add_argument('--force', action='store_true', help='已匯入過仍重新匯入')
+
+    commands.add_parser('stats', help='顯示資料庫大小與備份')
+
+    tenant = commands.add_parser('create-tenant', help='建立新租戶的資料庫')
+    tenant.add_argument('tenant_id', help='新租戶代號')
+
+    export = commands.add_parser('export', help='將訂單分批匯出到檔案（記憶體用量固定，適合網頁下載不了的大範圍）')
+    export.add_argument('--output', required=True, help='輸出檔路徑，副檔名 .xlsx 時匯出 Excel，其餘為 CSV')
+    export.add_argument('--start', help='起始日期 YYYY-MM-DD')
+    export.add_argument('--end', help='結束日期 YYYY-MM-DD')
+    export.add_argument('--store', help='只匯出這家店的訂單')
+    args = parser.parse_args(argv)
+    try:
+        use_tenant(args.tenant)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.command == 'backup':
+        path = backup_database(args.output, pages=args.pages, pause=args.pause)
+        print(f"已備份到 {path}（{_format_size(os.path.getsize(path))}）")
+    elif args.command == 'check':
+        problems = check_integrity(full=args.full)
+        for problem in problems:
+            print(problem)
+        print("檢查通過" if not problems else f"發現 {len(problems)} 個問題")
+        return 1 if problems else 0
+    elif args.command == 'compact':
+        result = compact_database(analyze=args.analyze, min_free_ratio=0 if args.force else VACUUM_MIN_FREE_RATIO)
+        before, after = result['整理前'], result['整理後']
+        print(f"{'已' if result['VACUUM'] else '未'}執行 VACUUM："
+              f"{_format_size(before['檔案大小'])} → {_format_size(after['檔案大小'])}，"
+              f"可用頁 {before['可用頁數']} → {after['可用頁數']}")
+    elif args.command == 'import-legacy':
+        summary = import_legacy_files(args.dir, force=args.force)
+        if summary is None:
+            print("已匯入過舊版檔案，如需重新匯入請加 --force")
+        else:
+            print("已匯入：" + "、".join(f"{key} {value}" for key, value in summary.items() if value is not None))
+    elif args.command == 'create-tenant':
+        try:
+            tenant_id = create_tenant(args.tenant_id)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"已建立租戶 {tenant_id}：{tenant_db_path(tenant_id)}")
+    elif args.command == 'export':
+        writer = write_orders_xlsx if args.output.lower().endswith('.xlsx') else write_orders_csv
+        with open(args.output, 'wb') as fp:
+            writer(fp, args.start, args.end, args.store)
+        print(f"已匯出到 {args.output}（{_format_size(os.path.getsize(args.output))}）")
+    elif args.command == 'stats':
+        stats = database_stats()
+        print(f"檔案大小 {_format_size(stats['檔案大小'])}，{stats['頁數']} 頁，可用 {stats['可用頁數']} 頁")
+        for path in list_backups():
+            print(f"備份 {os.path.basename(path)}  {_format_size(os.path.getsize(path))}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,30 +3,79 @@ import pandas as pd
 from datetime import time
 from utils import (
     load_store_config, save_store_config, load_cutoff_time, save_cutoff_time, 
-    load_orders_from_db, update_orders_in_db, clear_all_orders_in_db,
-    delete_orders_from_db, load_menus_from_db, update_menus_in_db, delete_store_from_db
+    load_orders_page, clear_all_orders_in_db,
+    delete_orders_from_db, load_store_names, load_store, load_store_menu, add_store, save_store_menu,
+    set_store_active, delete_store_from_db,
+    collect_order_changes, apply_order_changes, ensure_scheduler, load_archived_orders,
+    fetch_order_summary, fetch_item_counts, fetch_person_balances,
+    export_orders, count_export_rows, EXPORT_DOWNLOAD_MAX_ROWS, read_menu_import, validate_menu_import, preview_menu_import, upsert_menu_items,
+    use_tenant, select_tenant_from_query_params, tenant_context, list_tenants, tenant_exists, create_tenant,
+    load_sessions, create_session, set_session_status, ensure_default_session,
+    SESSION_OPEN, SESSION_CLOSED, fetch_orders_marker, fetch_orders_since,
+    load_metrics, summarize_metrics, reset_metrics, metrics_to_prometheus, write_metrics_jsonl, record_call,
+    METRICS_BUCKETS_MS, load_option_index, save_store_options, load_store_rotation, save_store_rotation,
+    WEEKDAY_NAMES, ORDER_SORT_COLUMNS
 )
+import importlib.util
+import io
 import os
+from time import perf_counter
+
+rerun_started = perf_counter()
+
+select_tenant_from_query_params()
 
 st.title("👨‍💼 管理者後台")
+if st.session_state.tenant:
+    st.caption(f"租戶：{st.session_state.tenant}")
 st.markdown("---")
 
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
-    
-menus_df = load_menus_from_db()
 
-if menus_df.empty:
-    all_store_names = []
-else:
-    menus_df['價格'] = pd.to_numeric(menus_df['價格'], errors='coerce').fillna(0).astype(int)
-    menus_df['店家名稱'] = menus_df['店家名稱'].fillna('')
-    all_store_names = sorted(menus_df['店家名稱'].unique().tolist())
-    all_store_names = [name for name in all_store_names if name]
+ensure_scheduler()
+    
+all_store_names = load_store_names(active_only=False)
+active_store_names = load_store_names()
 
 if "selected_menu_store" in st.session_state and st.session_state.selected_menu_store not in all_store_names:
     del st.session_state["selected_menu_store"]
 
+# 即時看板每隔幾秒檢查一次訂單異動（秒）與畫面上顯示的最新訂單筆數
+LIVE_BOARD_INTERVAL_SECONDS = 5
+LIVE_BOARD_RECENT_ROWS = 30
+
+def render_live_board(session_id):
+    """只抓取上次之後的新訂單並累加總數；訂單被修改或刪除時才整批重新讀取"""
+    # 自動更新時只重新執行這個 fragment，而且是在新的執行緒中，頁面開頭設定的租戶不會沿用
+    use_tenant(st.session_state.tenant)
+    board = st.session_state.get("live_board")
+    version, max_id = fetch_orders_marker()
+
+    if board is None or board["version"] != version or board["session_id"] != session_id or max_id < board["last_id"]:
+        rows = fetch_orders_since(0, session_id)
+        board = {"version": version, "session_id": session_id, "last_id": 0, "rows": rows.iloc[0:0],
+                 "count": 0, "quantity": 0, "total": 0}
+    else:
+        rows = fetch_orders_since(board["last_id"], session_id) if max_id > board["last_id"] else None
+
+    if rows is not None and not rows.empty:
+        quantity = rows["數量"].fillna(1)
+        board["count"] += len(rows)
+        board["quantity"] += int(quantity.sum())
+        board["total"] += int(((rows["價格"].fillna(0) + rows["加價"].fillna(0)) * quantity).sum())
+        board["rows"] = pd.concat([board["rows"], rows]).tail(LIVE_BOARD_RECENT_ROWS)
+    board["last_id"] = max(board["last_id"], max_id)
+    st.session_state.live_board = board
+
+    col_count, col_quantity, col_total = st.columns(3)
+    col_count.metric("訂單數", f"{board['count']} 筆")
+    col_quantity.metric("份數", f"{board['quantity']} 份")
+    col_total.metric("總金額", f"NT$ {board['total']}")
+
+    st.caption(f"最新 {LIVE_BOARD_RECENT_ROWS} 筆訂單")
+    st.dataframe(board["rows"].iloc[::-1], column_config={"id": None}, hide_index=True)
+
 if not st.session_state.logged_in:
     password = st.text_input("請輸入管理者密碼", type="password", key="login_password")
     if password == "admin603":
@@ -39,7 +88,7 @@ else:
         st.session_state.logged_in = False
         st.rerun()
     
-    tab1, tab2, tab3, tab4 = st.tabs(["🏡 菜單管理", "🗑️ 店家管理與刪除", "⚙️ 今日訂餐設定", "📊 訂單總覽"])
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["🏡 菜單管理", "🗑️ 店家管理與刪除", "⚙️ 今日訂餐設定", "📊 訂單總覽", "📺 即時看板", "🩺 效能監測"])
 
     with tab1:
         st.header("🏡 菜單管理")
@@ -49,22 +98,10 @@ else:
         
         if st.button("新增店家"):
             if new_store_name and new_store_name not in all_store_names:
-                new_row = pd.DataFrame([{'店家名稱': new_store_name, 
-                                        '店家地址': '',
-                                        '店家電話': '',
-                                        '便當品項': '無', 
-                                        '價格': 0}])
-                updated_menus_df = pd.concat([menus_df, new_row], ignore_index=True)
-                update_menus_in_db(updated_menus_df)
+                add_store(new_store_name)
                 st.success(f"✅ 已成功新增店家：**{new_store_name}**")
                 
                 st.session_state.selected_menu_store = new_store_name
-                
-                menus_df = load_menus_from_db()
-                menus_df['價格'] = pd.to_numeric(menus_df['價格'], errors='coerce').fillna(0).astype(int)
-                menus_df['店家名稱'] = menus_df['店家名稱'].fillna('')
-                all_store_names = sorted(menus_df['店家名稱'].unique().tolist())
-                all_store_names = [name for name in all_store_names if name]
                 st.rerun()
             else:
                 st.warning("⚠️ 請輸入有效的店家名稱，且店家名稱不能重複。")
@@ -88,24 +125,20 @@ else:
             st.session_state.selected_menu_store = None
 
         if st.session_state.selected_menu_store:
-            selected_store_df = menus_df[menus_df['店家名稱'] == st.session_state.selected_menu_store]
-            
-            if not selected_store_df.empty:
-                current_address = selected_store_df['店家地址'].iloc[0] if '店家地址' in selected_store_df.columns else ''
-                current_phone = selected_store_df['店家電話'].iloc[0] if '店家電話' in selected_store_df.columns else ''
-            else:
-                current_address = ''
-                current_phone = ''
+            # 只讀取正在編輯的這家店
+            selected_store_info = load_store(st.session_state.selected_menu_store) or {}
+            current_address = selected_store_info.get('店家地址', '')
+            current_phone = selected_store_info.get('店家電話', '')
 
             edited_address = st.text_input("店家地址", value=current_address, key="edited_address")
             edited_phone = st.text_input("店家電話", value=current_phone, key="edited_phone")
 
-            selected_menu_df = menus_df[menus_df['店家名稱'] == st.session_state.selected_menu_store].copy()
+            selected_menu_df = load_store_menu(st.session_state.selected_menu_store)
             
-            if len(selected_menu_df) == 1 and selected_menu_df['便當品項'].iloc[0] == '無':
+            if selected_menu_df.empty:
                 df_to_edit = pd.DataFrame([{'便當品項': '', '價格': 0}])
             else:
-                df_to_edit = selected_menu_df[selected_menu_df['便當品項'] != '無'][['便當品項', '價格']].copy()
+                df_to_edit = selected_menu_df[['便當品項', '價格']]
             
             edited_menus_df = st.data_editor(
                 df_to_edit,
@@ -120,31 +153,81 @@ else:
             )
             
             if st.button(f"儲存「{st.session_state.selected_menu_store}」的菜單變更"):
-                full_menus_df = load_menus_from_db()
-                remaining_menus_df = full_menus_df[full_menus_df['店家名稱'] != st.session_state.selected_menu_store]
-                
-                edited_menus_df = edited_menus_df[edited_menus_df['便當品項'] != ''].reset_index(drop=True)
-                
-                if edited_menus_df.empty:
-                    new_rows = [{'店家名稱': st.session_state.selected_menu_store, '便當品項': '無', '價格': 0, '店家地址': edited_address, '店家電話': edited_phone}]
-                else:
-                    new_rows = []
-                    for _, row in edited_menus_df.iterrows():
-                        new_rows.append({
-                            '店家名稱': st.session_state.selected_menu_store,
-                            '店家地址': edited_address,
-                            '店家電話': edited_phone,
-                            '便當品項': row['便當品項'],
-                            '價格': row['價格']
-                        })
-                
-                new_menus_df = pd.DataFrame(new_rows)
-                
-                updated_all_menus_df = pd.concat([remaining_menus_df, new_menus_df], ignore_index=True)
-                
-                update_menus_in_db(updated_all_menus_df)
+                save_store_menu(st.session_state.selected_menu_store, edited_address, edited_phone, edited_menus_df)
                 st.success("✅ 菜單變動已成功儲存！")
                 st.rerun()
+
+            st.markdown("##### 加點選項")
+            st.caption("例如：加飯 +10、不要辣 +0。加價以每份計算，點餐時可複選。")
+            store_options = load_option_index(st.session_state.selected_menu_store)
+            options_to_edit = pd.DataFrame(
+                [{'選項': option, '加價': extra_price} for option, extra_price in store_options.values()],
+                columns=['選項', '加價']
+            )
+            edited_options_df = st.data_editor(
+                options_to_edit,
+                column_config={
+                    "選項": st.column_config.TextColumn("選項", help="例如：加飯、不要辣"),
+                    "加價": st.column_config.NumberColumn("加價", help="每份加價，可為 0", format="NT$%d", step=1, default=0)
+                },
+                num_rows="dynamic",
+                hide_index=True,
+                key=f"options_data_editor_{st.session_state.selected_menu_store}"
+            )
+            if st.button(f"儲存「{st.session_state.selected_menu_store}」的加點選項"):
+                save_store_options(st.session_state.selected_menu_store, edited_options_df)
+                st.success("✅ 加點選項已儲存！")
+                st.rerun()
+
+            st.markdown("---")
+
+            st.subheader("批次匯入菜單")
+            st.caption("上傳 CSV / Excel 檔（需有「便當品項」、「價格」兩欄），或直接從 Excel 複製貼上。"
+                       "單一檔案上限 1 MB，較大的菜單請分成多個檔案一起上傳。")
+            import_files = st.file_uploader(
+                "上傳菜單檔案",
+                type=["csv", "xlsx"],
+                accept_multiple_files=True,
+                key=f"menu_import_files_{st.session_state.selected_menu_store}"
+            )
+            import_text = st.text_area(
+                "或貼上菜單（每行一個品項：品項、價格）",
+                key=f"menu_import_text_{st.session_state.selected_menu_store}"
+            )
+
+            if import_files or import_text.strip():
+                try:
+                    import_df = read_menu_import(import_files, import_text)
+                except ValueError as e:
+                    st.error(f"⚠️ {e}")
+                    import_df = None
+                except Exception as e:
+                    st.error(f"讀取匯入資料時發生錯誤: {e}")
+                    import_df = None
+
+                if import_df is not None:
+                    valid_import_df, import_errors_df = validate_menu_import(import_df)
+
+                    if not import_errors_df.empty:
+                        st.warning(f"⚠️ 有 {len(import_errors_df)} 列資料有問題，將不會匯入：")
+                        st.dataframe(import_errors_df, hide_index=True)
+
+                    if valid_import_df.empty:
+                        st.info("沒有可匯入的品項。")
+                    else:
+                        import_preview_df = preview_menu_import(st.session_state.selected_menu_store, valid_import_df)
+                        status_counts = import_preview_df['狀態'].value_counts()
+                        st.markdown(
+                            f"新增 **{status_counts.get('新增', 0)}** 項、"
+                            f"更新價格 **{status_counts.get('更新價格', 0)}** 項、"
+                            f"不變 **{status_counts.get('不變', 0)}** 項"
+                        )
+                        st.dataframe(import_preview_df, hide_index=True)
+
+                        if st.button(f"匯入到「{st.session_state.selected_menu_store}」"):
+                            imported = upsert_menu_items(st.session_state.selected_menu_store, valid_import_df)
+                            st.success(f"✅ 已匯入 {imported} 個品項！")
+                            st.rerun()
     with tab2:
         st.header("🗑️ 店家管理與刪除")
         
@@ -163,6 +246,22 @@ else:
                     st.rerun()
                 else:
                     st.warning("⚠️ 請至少選擇一個店家。")
+
+            st.markdown("---")
+
+            st.subheader("停用店家")
+            inactive_stores = st.multiselect(
+                "停用的店家不會出現在今日店家選單，但保留菜單資料",
+                options=all_store_names,
+                default=[name for name in all_store_names if name not in active_store_names]
+            )
+
+            if st.button("儲存停用設定"):
+                for store_name in all_store_names:
+                    if (store_name in inactive_stores) == (store_name in active_store_names):
+                        set_store_active(store_name, store_name not in inactive_stores)
+                st.success("✅ 已更新店家啟用狀態。")
+                st.rerun()
         else:
             st.info("目前沒有任何店家。")
     with tab3:
@@ -173,14 +272,14 @@ else:
         
         st.subheader("設定今日便當店家")
         
-        if all_store_names:
+        if active_store_names:
             try:
-                current_index = all_store_names.index(selected_store_by_admin) if selected_store_by_admin in all_store_names else 0
+                current_index = active_store_names.index(selected_store_by_admin) if selected_store_by_admin in active_store_names else 0
             except (ValueError, TypeError):
                 current_index = 0
             selected_store = st.selectbox(
                 "請選擇今日店家",
-                options=all_store_names,
+                options=active_store_names,
                 index=current_index
             )
             if st.button("確認店家設定"):
@@ -195,38 +294,179 @@ else:
 
         st.subheader("設定訂餐截止時間")
         
-        time_options = {
-            "上午 8:50": time(8, 50),
-            "下午 4:00": time(16, 0)
-        }
-        current_time_str = "上午 8:50" if current_cutoff_time == time(8, 50) else "下午 4:00"
-        
-        new_cutoff_time_str = st.selectbox(
-                "選擇截止時間",
-                options=list(time_options.keys()),
-                index=list(time_options.keys()).index(current_time_str) if current_time_str in time_options else 0
+        new_cutoff_time = st.time_input(
+            "選擇截止時間",
+            value=current_cutoff_time,
+            step=300
         )
         
         if st.button("確認時間設定"):
-            selected_time_obj = time_options[new_cutoff_time_str]
-            save_cutoff_time(selected_time_obj)
-            st.success(f"✅ 已成功設定訂餐截止時間為：**{new_cutoff_time_str}**")
+            save_cutoff_time(new_cutoff_time)
+            st.success(f"✅ 已成功設定訂餐截止時間為：**{new_cutoff_time.strftime('%H:%M')}**")
             st.info("請回到主頁面並重新整理，以查看變更。")
             st.rerun()
 
+        st.markdown("---")
+
+        st.subheader("每週店家輪替")
+        st.caption("每天第一次排程執行時（約午夜後）自動換上當天的店家；之後仍可在上方手動更改。停用的店家不會被輪替。")
+        store_rotation = load_store_rotation()
+        rotation_options = [""] + active_store_names
+        rotation_columns = st.columns(len(WEEKDAY_NAMES))
+        new_rotation = {}
+        for weekday, weekday_name in enumerate(WEEKDAY_NAMES):
+            current_store = store_rotation.get(weekday, "")
+            new_rotation[weekday] = rotation_columns[weekday].selectbox(
+                weekday_name,
+                options=rotation_options if current_store in rotation_options else rotation_options + [current_store],
+                index=(rotation_options + [current_store]).index(current_store),
+                format_func=lambda name: name or "不輪替",
+                key=f"rotation_{weekday}"
+            )
+        if st.button("儲存輪替設定"):
+            save_store_rotation(new_rotation)
+            st.success("✅ 每週輪替設定已儲存，明天起生效。")
+            st.rerun()
+
+        st.markdown("---")
+
+        st.subheader("今日訂餐場次")
+        st.caption("同一天可同時開放多個場次（例如午餐與下午茶），各自有店家與截止時間。今日店家設定會自動成為預設場次。")
+
+        ensure_default_session()
+        today_sessions = load_sessions()
+        if today_sessions:
+            st.dataframe(
+                [
+                    {
+                        '名稱': s['名稱'],
+                        '店家': s['店家名稱'],
+                        '開放時間': s['開放時間'].strftime('%H:%M'),
+                        '截止時間': s['截止時間'].strftime('%H:%M'),
+                        '狀態': '開放中' if s['狀態'] == SESSION_OPEN else '已關閉',
+                    }
+                    for s in today_sessions
+                ],
+                hide_index=True
+            )
+
+            session_labels = {s['id']: f"{s['名稱']}｜{s['店家名稱']}" for s in today_sessions}
+            toggled_session_id = st.selectbox(
+                "選擇場次",
+                options=list(session_labels.keys()),
+                format_func=session_labels.get,
+                key="toggle_session_select"
+            )
+            toggled_session = next(s for s in today_sessions if s['id'] == toggled_session_id)
+            if toggled_session['狀態'] == SESSION_OPEN:
+                if st.button("關閉此場次"):
+                    set_session_status(toggled_session_id, SESSION_CLOSED)
+                    st.rerun()
+            elif st.button("重新開放此場次"):
+                set_session_status(toggled_session_id, SESSION_OPEN)
+                st.rerun()
+        else:
+            st.info("今天還沒有訂餐場次。")
+
+        if active_store_names:
+            with st.form("new_session_form"):
+                st.markdown("**新增場次**")
+                new_session_name = st.text_input("場次名稱", value="下午茶")
+                new_session_store = st.selectbox("店家", options=active_store_names)
+                new_session_open = st.time_input("開放時間", value=time(0, 0), step=300)
+                new_session_cutoff = st.time_input("截止時間", value=time(14, 0), step=300)
+                if st.form_submit_button("新增場次"):
+                    if not new_session_name:
+                        st.warning("⚠️ 請輸入場次名稱。")
+                    elif new_session_open >= new_session_cutoff:
+                        st.warning("⚠️ 截止時間必須晚於開放時間。")
+                    else:
+                        create_session(new_session_name, new_session_store, new_session_open, new_session_cutoff)
+                        st.success(f"✅ 已新增場次：**{new_session_name}**")
+                        st.rerun()
+
+        # 只有預設租戶的管理者可以新增租戶；網址中不存在的租戶代號不會自動建立資料庫
+        if not st.session_state.tenant:
+            st.markdown("---")
+
+            st.subheader("🏢 租戶管理")
+            other_tenants = list_tenants()[1:]
+            if other_tenants:
+                st.caption("已建立的租戶：" + "、".join(other_tenants))
+            new_tenant = st.text_input("新租戶代號（英數字、- 或 _，最多 32 字）", key="new_tenant_id")
+            if st.button("建立租戶"):
+                try:
+                    if tenant_exists(new_tenant.strip()):
+                        st.warning(f"⚠️ 租戶 **{new_tenant.strip()}** 已存在。")
+                    else:
+                        tenant_id = create_tenant(new_tenant)
+                        st.success(f"✅ 已建立租戶 **{tenant_id}**，請以網址參數 ?tenant={tenant_id} 進入。")
+                except ValueError as e:
+                    st.error(str(e))
+
     with tab4:
         st.header("📊 訂單總覽")
-        
-        orders_df = load_orders_from_db()
 
-        if not orders_df.empty:
-            orders_df['價格'] = pd.to_numeric(orders_df['價格'], errors='coerce').fillna(0).astype(int)
+        # 依訂餐場次篩選（session_id 有索引，歷史資料再多也只查該場次）
+        overview_sessions = {s['id']: f"{s['名稱']}｜{s['店家名稱']}" for s in load_sessions()}
+        overview_session_id = st.selectbox(
+            "訂餐場次",
+            options=[None] + list(overview_sessions.keys()),
+            format_func=lambda sid: "全部場次" if sid is None else overview_sessions[sid],
+            key="overview_session"
+        )
+        
+        # 彙總數字由 SQLite 計算，不需在 pandas 中重新加總整張表
+        summary = fetch_order_summary(overview_session_id)
 
+        if summary['訂單數']:
             st.subheader("所有已送出訂單")
+
+            # 篩選、排序與分頁都在資料庫中完成，瀏覽器每次只收到一頁
+            col_name, col_store, col_day, col_unpaid = st.columns([2, 2, 2, 1])
+            filter_name = col_name.text_input("姓名包含", key="overview_filter_name").strip()
+            filter_store = col_store.selectbox(
+                "店家", options=[""] + all_store_names, format_func=lambda name: name or "全部店家",
+                key="overview_filter_store"
+            )
+            filter_day = col_day.date_input("日期", value=None, key="overview_filter_day")
+            filter_unpaid = col_unpaid.checkbox("只看未付款", key="overview_filter_unpaid")
+
+            col_sort, col_desc, col_page_size = st.columns([2, 1, 1])
+            sort_by = col_sort.selectbox("排序", options=ORDER_SORT_COLUMNS, key="overview_sort")
+            sort_descending = col_desc.toggle("由大到小", key="overview_sort_desc")
+            page_size = col_page_size.selectbox("每頁筆數", options=[25, 50, 100, 200], index=1, key="overview_page_size")
+
+            filters = dict(
+                session_id=overview_session_id, name_contains=filter_name, store_name=filter_store,
+                unpaid_only=filter_unpaid, day=filter_day, sort_by=sort_by, descending=sort_descending
+            )
+            # 條件改變時回到第一頁
+            if st.session_state.get("overview_filters") != (filters, page_size):
+                st.session_state.overview_filters = (filters, page_size)
+                st.session_state.overview_page = 1
+            orders_df, matched_total = load_orders_page(st.session_state.overview_page - 1, page_size, **filters)
+            page_count = max(1, -(-matched_total // page_size))
+            if st.session_state.overview_page > page_count:
+                # 刪除訂單後最後一頁可能變空，改顯示新的最後一頁
+                st.session_state.overview_page = page_count
+                orders_df, matched_total = load_orders_page(page_count - 1, page_size, **filters)
+            st.number_input(f"頁數（共 {page_count} 頁，符合條件 {matched_total} 筆）", min_value=1, max_value=page_count,
+                            step=1, key="overview_page")
+
+            # 編輯器的 edited_rows 以列位置記錄，儲存後換一個 key 重新載入，
+            # 避免「只看未付款」等條件讓列位置改變後，舊的變更套用到別筆訂單
+            editor_version = st.session_state.setdefault("overview_editor_version", 0)
+            editor_key = f"admin_data_editor_{editor_version}"
+            if st.session_state.pop("overview_saved", False):
+                st.info("訂單變動已自動儲存。")
+
             edited_df = st.data_editor(
                 orders_df,
                 column_config={
                     "id": None,
+                    "日期": None,
+                    "session_id": None,
                     "已付款": st.column_config.CheckboxColumn(
                         "已付款",
                         help="勾選此欄位表示此筆訂單已完成付款",
@@ -253,12 +493,17 @@ else:
                     )
                 },
                 hide_index=True,
-                key="admin_data_editor"
+                key=editor_key
             )
             
-            if not edited_df.equals(orders_df):
-                update_orders_in_db(edited_df)
-                st.info("訂單變動已自動儲存。")
+            # 只把這一頁編輯器中實際變動的儲存格寫回資料庫
+            editor_state = st.session_state.get(editor_key, {})
+            order_changes = collect_order_changes(orders_df, editor_state.get("edited_rows", {}))
+            if order_changes:
+                apply_order_changes(order_changes)
+                st.session_state.overview_editor_version = editor_version + 1
+                st.session_state.overview_saved = True
+                st.rerun()
                 
             orders_to_delete = edited_df[edited_df["刪除"] == True]
             if not orders_to_delete.empty:
@@ -267,25 +512,89 @@ else:
                     delete_orders_from_db(order_ids_to_delete)
                     st.success("✅ 已成功刪除選取的訂單。")
                     st.rerun()
-                    
-            selected_orders = edited_df[edited_df["選取"] == True]
-            selected_total = selected_orders["價格"].sum()
 
-            st.markdown(f"#### **總訂單數**：{len(orders_df)} 筆")
-            st.markdown(f"#### **所有訂單總金額**：NT$ {orders_df['價格'].sum()}")
-            st.markdown(f"### **已選取訂單總金額**：<font color='green'>NT$ {selected_total}</font>", unsafe_allow_html=True)
+            st.markdown(f"#### **總訂單數**：{summary['訂單數']} 筆（共 {summary['份數']} 份）")
+            col_total, col_paid, col_unpaid = st.columns(3)
+            col_total.metric("所有訂單總金額", f"NT$ {summary['總金額']}")
+            col_paid.metric("已付款", f"NT$ {summary['已付款']}")
+            col_unpaid.metric("未付款", f"NT$ {summary['未付款']}")
+            st.markdown(f"### **已選取訂單總金額**：<font color='green'>NT$ {summary['已選取']}</font>", unsafe_allow_html=True)
 
-            csv_export = orders_df.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="📥 下載所有訂單 (CSV)",
-                data=csv_export,
-                file_name='lunch_orders.csv',
-                mime='text/csv',
-            )
+            with st.expander("🧾 品項統計（訂餐用）"):
+                item_counts = fetch_item_counts(overview_session_id)
+                item_lines = []
+                for row in item_counts:
+                    options_text = f"（{row['選項']}）" if row['選項'] else ""
+                    item_lines.append(f"{row['店家名稱']} {row['便當品項']}{options_text} x{row['份數']}")
+                st.text("\n".join(item_lines))
+                st.dataframe(item_counts, hide_index=True)
+
+            with st.expander("💰 個人應付金額"):
+                st.dataframe(fetch_person_balances(overview_session_id), hide_index=True)
         else:
             st.info("目前還沒有人訂餐。")
 
         st.markdown("---")
+
+        st.header("📥 匯出訂單")
+        export_formats = ["CSV"]
+        if importlib.util.find_spec("openpyxl") is not None:
+            export_formats.append("XLSX")
+
+        export_range = st.date_input("日期範圍（不選則匯出全部）", value=(), key="export_date_range")
+        export_start = export_range[0] if len(export_range) > 0 else None
+        export_end = export_range[1] if len(export_range) > 1 else export_start
+        export_store = st.selectbox("店家", options=["全部店家"] + all_store_names, key="export_store")
+        export_format = st.radio("檔案格式", options=export_formats, horizontal=True, key="export_format")
+
+        # 只有按下下載時才從資料庫分批產生檔案；這時不在頁面的執行緒中，須明確指定租戶
+        export_file_format = export_format.lower()
+        export_tenant = st.session_state.tenant
+        export_store_name = None if export_store == "全部店家" else export_store
+        export_rows = count_export_rows(export_start, export_end, export_store_name)
+
+        def build_export():
+            with tenant_context(export_tenant):
+                return export_orders(export_file_format, export_start, export_end, export_store_name)
+
+        # 下載的檔案會整個放在伺服器記憶體中，筆數太多時改用命令列直接寫到檔案
+        if export_rows > EXPORT_DOWNLOAD_MAX_ROWS:
+            st.warning(
+                f"⚠️ 符合條件的訂單有 {export_rows:,} 筆，超過網頁下載上限 {EXPORT_DOWNLOAD_MAX_ROWS:,} 筆。"
+                f"請縮小日期範圍，或在伺服器上執行 `python maintenance.py export --output 檔名.{export_file_format}`。"
+            )
+        else:
+            st.download_button(
+                label=f"📥 下載訂單 ({export_format}，{export_rows:,} 筆)",
+                data=build_export,
+                file_name=f'lunch_orders.{export_file_format}',
+                mime='text/csv' if export_file_format == 'csv' else 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                on_click="ignore"
+            )
+
+        st.markdown("---")
+
+        st.header("📚 歷史訂單")
+        if st.toggle("顯示歷史訂單", key="show_archived_orders"):
+            history_range = st.date_input("日期範圍", value=(), key="archive_date_range")
+            start_date = history_range[0] if len(history_range) > 0 else None
+            end_date = history_range[1] if len(history_range) > 1 else start_date
+
+            page_size = 50
+            page = st.number_input("頁數", min_value=1, value=1, step=1, key="archive_page") - 1
+            archived_df, archived_total = load_archived_orders(page, page_size, start_date, end_date)
+
+            if archived_total:
+                st.caption(f"共 {archived_total} 筆，第 {page + 1} / {(archived_total - 1) // page_size + 1} 頁")
+                st.dataframe(
+                    archived_df.drop(columns=['選取', '刪除']),
+                    column_config={"id": None, "session_id": None},
+                    hide_index=True
+                )
+            else:
+                st.info("沒有符合條件的歷史訂單。")
+
+        st.markdown("---")
         
         st.header("🗑️ 清除所有訂單")
         st.warning("⚠️ 此操作會永久刪除所有訂單資料，請謹慎使用。")
@@ -295,4 +604,69 @@ else:
             st.success("✅ 所有訂單已成功清除！")
             st.rerun()
 
+    with tab5:
+        st.header("📺 即時看板")
+        st.caption("自動更新時只讀取新進的訂單，不需要重新整理整個頁面。")
+
+        board_sessions = {s['id']: f"{s['名稱']}｜{s['店家名稱']}" for s in load_sessions()}
+        board_session_id = st.selectbox(
+            "訂餐場次",
+            options=[None] + list(board_sessions.keys()),
+            format_func=lambda sid: "全部場次" if sid is None else board_sessions[sid],
+            key="board_session"
+        )
+        auto_refresh = st.toggle("自動更新", value=True, key="board_auto_refresh")
+
+        st.fragment(run_every=LIVE_BOARD_INTERVAL_SECONDS if auto_refresh else None)(render_live_board)(board_session_id)
+
+    with tab6:
+        st.header("🩺 效能監測")
+        st.caption("記錄本伺服器行程最近的資料庫呼叫與頁面重新執行耗時（rerun:*），重新啟動後會清空。")
+
+        metrics_summary = summarize_metrics()
+        if not metrics_summary:
+            st.info("目前沒有監測紀錄。")
+        else:
+            st.subheader("各函式彙總")
+            st.dataframe(pd.DataFrame(metrics_summary), hide_index=True)
+
+            st.subheader("耗時分布")
+            histogram_name = st.selectbox("函式", options=[row['函式'] for row in metrics_summary], key="metrics_histogram")
+            bucket_labels = [f"≤{bound}ms" for bound in METRICS_BUCKETS_MS] + [f">{METRICS_BUCKETS_MS[-1]}ms"]
+            bucket_counts = [0] * len(bucket_labels)
+            for entry in load_metrics():
+                if entry['name'] == histogram_name:
+                    bucket_counts[next((i for i, bound in enumerate(METRICS_BUCKETS_MS) if entry['ms'] <= bound), len(METRICS_BUCKETS_MS))] += 1
+            st.bar_chart(pd.DataFrame({'呼叫次數': bucket_counts}, index=pd.Index(bucket_labels, name='耗時')), sort=False)
+
+            st.subheader("最慢的呼叫")
+            slowest_calls = pd.DataFrame(sorted(load_metrics(), key=lambda entry: entry['ms'], reverse=True)[:20])
+            slowest_calls['ts'] = pd.to_datetime(slowest_calls['ts'], unit='s', utc=True).dt.tz_convert('Asia/Taipei').dt.strftime('%H:%M:%S')
+            st.dataframe(slowest_calls, hide_index=True)
+
+        col_prometheus, col_jsonl, col_reset = st.columns(3)
+        col_prometheus.download_button(
+            "⬇️ Prometheus 格式",
+            data=metrics_to_prometheus,
+            file_name="lunch_metrics.prom",
+            mime="text/plain",
+            on_click="ignore"
+        )
+
+        def metrics_jsonl():
+            output = io.StringIO()
+            write_metrics_jsonl(output)
+            return output.getvalue()
+
+        col_jsonl.download_button(
+            "⬇️ JSONL 紀錄",
+            data=metrics_jsonl,
+            file_name="lunch_metrics.jsonl",
+            mime="application/jsonl",
+            on_click="ignore"
+        )
+        if col_reset.button("清除監測紀錄"):
+            reset_metrics()
+            st.rerun()
 
+record_call("rerun:admin", (perf_counter() - rerun_started) * 1000)
@@ -1,191 +1,2011 @@
-import streamlit as st
-import pandas as pd
 import sqlite3
+import contextvars
+import csv
+import functools
+import io
+import json
+import logging
 import os
+import queue
+import re
+import tempfile
+import threading
+import time as _time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import time, datetime, timedelta
 
-DB_PATH = 'data/lunch_orders.db'
+DB_PATH = os.environ.get('LUNCH_DB_PATH', 'data/lunch_orders.db')
 
-# 確保資料庫目錄存在
-os.makedirs('data', exist_ok=True)
+# 其他部門／樓層（租戶）各自使用 data/tenants/<租戶代號>.db
+DATA_DIR = os.path.dirname(DB_PATH) or '.'
+TENANT_DIR = os.path.join(DATA_DIR, 'tenants')
+DEFAULT_TENANT = ''
+TENANT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
 
-def init_db():
-    """初始化資料庫並創建表格（如果不存在）"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS orders (
-            id INTEGER PRIMARY KEY,
-            姓名 TEXT,
-            店家名稱 TEXT,
-            便當品項 TEXT,
-            價格 INTEGER,
-            數量 INTEGER,
-            備註 TEXT,
-            時間 TEXT,
-            已付款 BOOLEAN,
-            選取 BOOLEAN,
-            刪除 BOOLEAN
+# 連線池設定：所有租戶共用的閒置連線上限與鎖定等待時間（毫秒）
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+
+# 菜單／設定快取多久向資料庫確認一次版本號（秒），以及最多保留幾個租戶的快取
+CACHE_TTL_SECONDS = 2
+CACHE_MAX_TENANTS = 64
+
+# --- 租戶 ---
+
+_current_tenant = contextvars.ContextVar('lunch_tenant', default=DEFAULT_TENANT)
+
+def _validate_tenant_id(tenant_id):
+    tenant_id = (tenant_id or '').strip()
+    if tenant_id and not TENANT_ID_PATTERN.match(tenant_id):
+        raise ValueError(f"不合法的租戶代號：{tenant_id}")
+    return tenant_id
+
+def use_tenant(tenant_id):
+    """設定目前執行緒後續查詢所使用的租戶，代號不合法或租戶不存在時丟出 ValueError
+
+    只接受已建立的租戶（資料庫檔已存在），網址打錯或任意代號不會產生新的資料庫；新租戶請用 create_tenant()。
+    """
+    tenant_id = _validate_tenant_id(tenant_id)
+    if not tenant_exists(tenant_id):
+        raise ValueError(f"找不到租戶：{tenant_id}")
+    _current_tenant.set(tenant_id)
+    return tenant_id
+
+def select_tenant_from_query_params():
+    """Streamlit 頁面開頭呼叫：依網址參數 ?tenant= 選擇部門／樓層的資料庫並存入 st.session_state.tenant，
+    切換頁面時沿用同一個租戶；租戶不存在時顯示錯誤並停止執行頁面"""
+    import streamlit as st
+    try:
+        st.session_state.tenant = use_tenant(st.query_params.get("tenant", st.session_state.get("tenant", "")))
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    return st.session_state.tenant
+
+def tenant_exists(tenant_id):
+    """租戶是否已建立（預設租戶永遠存在）"""
+    return not tenant_id or os.path.exists(tenant_db_path(tenant_id))
+
+def create_tenant(tenant_id):
+    """建立新租戶的資料庫並套用結構遷移（已存在時不做任何事），回傳租戶代號"""
+    tenant_id = _validate_tenant_id(tenant_id)
+    if not tenant_id:
+        raise ValueError("請輸入租戶代號")
+    with tenant_context(tenant_id):
+        with get_connection():
+            pass
+    return tenant_id
+
+def current_tenant():
+    """回傳目前使用中的租戶代號（預設租戶為空字串）"""
+    return _current_tenant.get()
+
+@contextmanager
+def tenant_context(tenant_id):
+    """暫時切換到指定租戶，離開時還原"""
+    token = _current_tenant.set(tenant_id)
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+def tenant_db_path(tenant_id=None):
+    """回傳租戶的資料庫檔案路徑"""
+    tenant_id = current_tenant() if tenant_id is None else tenant_id
+    if not tenant_id:
+        return DB_PATH
+    return os.path.join(TENANT_DIR, f'{tenant_id}.db')
+
+# --- 連線管理 ---
+# 閒置連線依資料庫路徑放在同一個 LIFO 清單中，總數不超過 POOL_SIZE，
+# 超過時關閉最久沒用的連線，因此閒置連線的數量與租戶多寡無關。
+
+_idle_connections = []
+_idle_lock = threading.Lock()
+_local = threading.local()
+_initialized_paths = set()
+_init_lock = threading.Lock()
+_sql_trace_callback = None
+
+def set_sql_trace(callback):
+    """設定 SQL 追蹤函式（傳入 None 取消），之後借出的連線每執行一句 SQL 就以該語句呼叫一次"""
+    global _sql_trace_callback
+    _sql_trace_callback = callback
+
+def _open_connection(path):
+    """建立新連線並套用 WAL 與效能相關的 PRAGMA；每個資料庫第一次連線時執行結構遷移"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        check_same_thread=False
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-8000")
+    conn.execute("PRAGMA foreign_keys=ON")
+
+    if path not in _initialized_paths:
+        with _init_lock:
+            if path not in _initialized_paths:
+                _apply_migrations(conn)
+                _initialized_paths.add(path)
+    return conn
+
+def _acquire_connection(path):
+    with _idle_lock:
+        for i in range(len(_idle_connections) - 1, -1, -1):
+            if _idle_connections[i][0] == path:
+                return _idle_connections.pop(i)[1]
+    return _open_connection(path)
+
+def _release_connection(path, conn):
+    if conn.in_transaction:
+        conn.execute("ROLLBACK")
+    with _idle_lock:
+        _idle_connections.append((path, conn))
+        evicted = _idle_connections.pop(0)[1] if len(_idle_connections) > POOL_SIZE else None
+    if evicted is not None:
+        evicted.close()
+
+@contextmanager
+def get_connection():
+    """從連線池借用目前租戶的連線，同一執行緒內巢狀使用時共用同一條連線"""
+    path = tenant_db_path()
+    held = getattr(_local, 'conns', None)
+    if held is None:
+        held = _local.conns = {}
+    conn = held.get(path)
+    if conn is not None:
+        yield conn
+        return
+
+    conn = _acquire_connection(path)
+    conn.set_trace_callback(_sql_trace_callback)
+    held[path] = conn
+    try:
+        yield conn
+    finally:
+        del held[path]
+        _release_connection(path, conn)
+
+@contextmanager
+def transaction():
+    """開啟寫入交易（BEGIN IMMEDIATE），成功時提交、發生例外時回滾"""
+    with get_connection() as conn:
+        if conn.in_transaction:
+            yield conn
+            return
+
+        # 取得寫入鎖的等待時間與寫入筆數累計在執行緒上，供效能監測使用
+        start = _time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        _local.lock_wait_ms = getattr(_local, 'lock_wait_ms', 0.0) + (_time.perf_counter() - start) * 1000
+        changes = conn.total_changes
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        if conn.in_transaction:
+            conn.execute("COMMIT")
+        _local.rows_written = getattr(_local, 'rows_written', 0) + conn.total_changes - changes
+
+# --- 效能監測 ---
+# 資料庫函式每次呼叫都記錄耗時、回傳筆數、寫入筆數（含觸發器）與等待寫入鎖的時間。
+# 最近 METRICS_BUFFER_SIZE 筆放在環狀緩衝區供管理頁面檢視，另外依函式累計總數供匯出。
+
+METRICS_ENABLED = os.environ.get('LUNCH_METRICS', '1') != '0'
+METRICS_BUFFER_SIZE = 5000
+METRICS_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_metrics_buffer = deque(maxlen=METRICS_BUFFER_SIZE)
+_metrics_totals = {}
+_metrics_lock = threading.Lock()
+# 排程工作執行期間不逐一記錄內部呼叫，改由 _run_scheduled_job 整體記一筆
+_metrics_muted = contextvars.ContextVar('lunch_metrics_muted', default=False)
+
+def instrumented(func):
+    """記錄被包裝函式的呼叫次數、耗時、讀寫筆數與鎖等待時間"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not METRICS_ENABLED or _metrics_muted.get():
+            return func(*args, **kwargs)
+        written = getattr(_local, 'rows_written', 0)
+        lock_wait = getattr(_local, 'lock_wait_ms', 0.0)
+        start = _time.perf_counter()
+        result = None
+        error = True
+        try:
+            result = func(*args, **kwargs)
+            error = False
+            return result
+        finally:
+            record_call(
+                name,
+                (_time.perf_counter() - start) * 1000,
+                rows_read=_result_rows(result),
+                rows_written=getattr(_local, 'rows_written', 0) - written,
+                lock_wait_ms=getattr(_local, 'lock_wait_ms', 0.0) - lock_wait,
+                error=error
+            )
+    return wrapper
+
+def _result_rows(result):
+    """估計回傳的資料筆數：DataFrame 與清單取長度，(DataFrame, 總數) 取 DataFrame，其他值算一筆"""
+    if result is None:
+        return 0
+    if isinstance(result, tuple) and result and hasattr(result[0], 'shape'):
+        result = result[0]
+    if hasattr(result, 'shape'):
+        return result.shape[0]
+    if isinstance(result, list):
+        return len(result)
+    return 1
+
+def record_call(name, duration_ms, rows_read=0, rows_written=0, lock_wait_ms=0.0, error=False):
+    """寫入一筆監測紀錄（頁面也用來記錄每次重新執行的耗時）"""
+    entry = {
+        'ts': _time.time(),
+        'name': name,
+        'tenant': current_tenant(),
+        'ms': round(duration_ms, 3),
+        'rows_read': rows_read,
+        'rows_written': rows_written,
+        'lock_wait_ms': round(lock_wait_ms, 3),
+        'error': error,
+    }
+    bucket = next((i for i, bound in enumerate(METRICS_BUCKETS_MS) if duration_ms <= bound), len(METRICS_BUCKETS_MS))
+    with _metrics_lock:
+        _metrics_buffer.append(entry)
+        totals = _metrics_totals.get(name)
+        if totals is None:
+            totals = _metrics_totals[name] = {
+                'calls': 0, 'errors': 0, 'ms': 0.0, 'rows_read': 0, 'rows_written': 0, 'lock_wait_ms': 0.0,
+                'buckets': [0] * (len(METRICS_BUCKETS_MS) + 1)
+            }
+        totals['calls'] += 1
+        totals['errors'] += error
+        totals['ms'] += duration_ms
+        totals['rows_read'] += rows_read
+        totals['rows_written'] += rows_written
+        totals['lock_wait_ms'] += lock_wait_ms
+        totals['buckets'][bucket] += 1
+
+def load_metrics():
+    """回傳環狀緩衝區中的監測紀錄（由舊到新）"""
+    with _metrics_lock:
+        return list(_metrics_buffer)
+
+def reset_metrics():
+    """清除所有監測紀錄與累計值"""
+    with _metrics_lock:
+        _metrics_buffer.clear()
+        _metrics_totals.clear()
+
+def summarize_metrics():
+    """依函式彙總緩衝區中的紀錄：呼叫次數、錯誤數、p50／p99／最大耗時與讀寫筆數，依總耗時排序"""
+    groups = {}
+    for entry in load_metrics():
+        groups.setdefault(entry['name'], []).append(entry)
+    summary = []
+    for name, entries in groups.items():
+        durations = sorted(entry['ms'] for entry in entries)
+        summary.append({
+            '函式': name,
+            '呼叫次數': len(entries),
+            '錯誤': sum(entry['error'] for entry in entries),
+            'p50 (ms)': durations[(len(durations) - 1) // 2],
+            'p99 (ms)': durations[min(len(durations) - 1, int(len(durations) * 0.99))],
+            '最大 (ms)': durations[-1],
+            '總耗時 (ms)': round(sum(durations), 1),
+            '讀取筆數': sum(entry['rows_read'] for entry in entries),
+            '寫入筆數': sum(entry['rows_written'] for entry in entries),
+            '鎖等待 (ms)': round(sum(entry['lock_wait_ms'] for entry in entries), 1),
+        })
+    summary.sort(key=lambda row: row['總耗時 (ms)'], reverse=True)
+    return summary
+
+def metrics_to_prometheus():
+    """以 Prometheus 文字格式輸出各函式的累計值與耗時分布"""
+    with _metrics_lock:
+        totals = {name: dict(values, buckets=list(values['buckets'])) for name, values in _metrics_totals.items()}
+
+    def label(name):
+        return name.replace('\\', '\\\\').replace('"', '\\"')
+
+    lines = []
+    for metric, key, kind, help_text in (
+        ('lunch_calls_total', 'calls', 'counter', 'Number of instrumented calls'),
+        ('lunch_call_errors_total', 'errors', 'counter', 'Number of calls that raised'),
+        ('lunch_rows_read_total', 'rows_read', 'counter', 'Rows returned by instrumented calls'),
+        ('lunch_rows_written_total', 'rows_written', 'counter', 'Rows changed by instrumented calls'),
+        ('lunch_lock_wait_ms_total', 'lock_wait_ms', 'counter', 'Milliseconds spent waiting for the write lock'),
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, values in totals.items():
+            lines.append(f'{metric}{{name="{label(name)}"}} {values[key]:g}')
+
+    lines.append("# HELP lunch_call_duration_ms Call latency in milliseconds")
+    lines.append("# TYPE lunch_call_duration_ms histogram")
+    for name, values in totals.items():
+        cumulative = 0
+        for bound, count in zip(METRICS_BUCKETS_MS + ('+Inf',), values['buckets']):
+            cumulative += count
+            lines.append(f'lunch_call_duration_ms_bucket{{name="{label(name)}",le="{bound}"}} {cumulative}')
+        lines.append(f'lunch_call_duration_ms_sum{{name="{label(name)}"}} {values["ms"]:.3f}')
+        lines.append(f'lunch_call_duration_ms_count{{name="{label(name)}"}} {values["calls"]}')
+    return "\n".join(lines) + "\n"
+
+def write_metrics_jsonl(output):
+    """將緩衝區中的監測紀錄以 JSON Lines 寫入文字檔物件"""
+    for entry in load_metrics():
+        output.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+# --- 資料表結構與版本遷移 ---
+
+# 各遷移使用的資料表定義寫定後就不再修改，否則舊版本升級與新建的資料庫會得到不同的資料表；
+# 之後新增的欄位一律在新的遷移中以 ALTER TABLE 加入
+ORDERS_TABLE_V1_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY,
+        姓名 TEXT,
+        店家名稱 TEXT,
+        便當品項 TEXT,
+        價格 INTEGER,
+        數量 INTEGER,
+        備註 TEXT,
+        時間 TEXT,
+        已付款 BOOLEAN,
+        選取 BOOLEAN,
+        刪除 BOOLEAN,
+        日期 TEXT
+    )
+'''
+
+ORDERS_TABLE_V3_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        姓名 TEXT,
+        店家名稱 TEXT,
+        便當品項 TEXT,
+        價格 INTEGER,
+        數量 INTEGER,
+        備註 TEXT,
+        時間 TEXT,
+        已付款 BOOLEAN,
+        選取 BOOLEAN,
+        刪除 BOOLEAN,
+        日期 TEXT
+    )
+'''
+
+MENUS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY,
+        店家名稱 TEXT,
+        店家地址 TEXT,
+        店家電話 TEXT,
+        便當品項 TEXT,
+        價格 INTEGER
+    )
+'''
+
+def _table_columns(conn, table):
+    """回傳資料表的欄位名稱"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def _rebuild_table(conn, table, create_sql):
+    """依 create_sql 重建資料表並搬移共同欄位，修復被 to_sql 覆蓋掉的主鍵與欄位型別"""
+    old_cols = _table_columns(conn, table)
+    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    conn.execute(create_sql.format(table=table))
+    new_cols = _table_columns(conn, table)
+    cols = [col for col in old_cols if col in new_cols]
+
+    # 舊表的 id 可能是 REAL 或有重複值，此時改由 SQLite 重新編號
+    if 'id' in cols:
+        duplicated = conn.execute(f"SELECT COUNT(id) - COUNT(DISTINCT id) FROM {table}_old").fetchone()[0]
+        if duplicated:
+            cols.remove('id')
+
+    col_list = ', '.join(cols)
+    conn.execute(f"INSERT INTO {table} ({col_list}) SELECT {col_list} FROM {table}_old")
+    conn.execute(f"DROP TABLE {table}_old")
+
+def _add_column_if_missing(conn, table, column, declaration):
+    """欄位不存在時才以 ALTER TABLE 新增"""
+    if column not in _table_columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+def _migration_base_tables(conn):
+    conn.execute(ORDERS_TABLE_V1_SQL.format(table='orders'))
+    conn.execute(MENUS_TABLE_SQL.format(table='menus'))
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS config (
+            key TEXT PRIMARY KEY,
+            value TEXT
         )
     ''')
-    
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS menus (
-            id INTEGER PRIMARY KEY,
-            店家名稱 TEXT,
-            店家地址 TEXT,
-            店家電話 TEXT,
-            便當品項 TEXT,
-            價格 INTEGER
+
+def _migration_date_column_and_indexes(conn):
+    _rebuild_table(conn, 'orders', ORDERS_TABLE_V1_SQL)
+    _rebuild_table(conn, 'menus', MENUS_TABLE_SQL)
+    conn.execute("UPDATE orders SET 日期 = substr(時間, 1, 10) WHERE 日期 IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_name ON orders (姓名)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_time ON orders (時間)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_date ON orders (日期)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_menus_store ON menus (店家名稱)")
+
+def _migration_orders_archive(conn):
+    # 改用 AUTOINCREMENT，封存後的訂單 id 不會被新訂單重複使用
+    _rebuild_table(conn, 'orders', ORDERS_TABLE_V3_SQL)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_name ON orders (姓名)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_time ON orders (時間)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_date ON orders (日期)")
+    conn.execute(ORDERS_TABLE_V3_SQL.format(table='orders_archive'))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_archive_date ON orders_archive (日期)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_archive_name ON orders_archive (姓名)")
+
+def _migration_menu_item_key(conn):
+    # 同一店家的重複品項只保留最後一筆，再加上 (店家名稱, 便當品項) 唯一索引供 upsert 使用
+    conn.execute('''
+        DELETE FROM menus WHERE id NOT IN (
+            SELECT MAX(id) FROM menus GROUP BY 店家名稱, 便當品項
         )
     ''')
-    
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS config (
-            key TEXT PRIMARY KEY,
-            value TEXT
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_menus_store_item ON menus (店家名稱, 便當品項)")
+
+def _migration_stores_and_menu_items(conn):
+    # 店家資料獨立成 stores，品項以 store_id 參照；不再需要「便當品項 = '無'」的佔位列
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stores (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            店家名稱 TEXT NOT NULL UNIQUE,
+            店家地址 TEXT DEFAULT '',
+            店家電話 TEXT DEFAULT '',
+            啟用 BOOLEAN NOT NULL DEFAULT 1
         )
     ''')
-    
-    conn.commit()
-    conn.close()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS menu_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            store_id INTEGER NOT NULL REFERENCES stores (id) ON DELETE CASCADE,
+            便當品項 TEXT NOT NULL,
+            價格 INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (store_id, 便當品項)
+        )
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO stores (店家名稱, 店家地址, 店家電話)
+        SELECT 店家名稱, COALESCE(MAX(店家地址), ''), COALESCE(MAX(店家電話), '')
+        FROM menus
+        WHERE 店家名稱 IS NOT NULL AND 店家名稱 != ''
+        GROUP BY 店家名稱
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO menu_items (store_id, 便當品項, 價格)
+        SELECT s.id, m.便當品項, CAST(COALESCE(m.價格, 0) AS INTEGER)
+        FROM menus m JOIN stores s ON s.店家名稱 = m.店家名稱
+        WHERE m.便當品項 IS NOT NULL AND m.便當品項 NOT IN ('', '無')
+        ORDER BY m.id
+    ''')
+    conn.execute("DROP TABLE menus")
 
-# 初始化資料庫
-init_db()
+def _migration_order_token(conn):
+    # 每次送出訂單帶一個提交代碼，重複送出（連點、重新執行）時由唯一索引擋下
+    _add_column_if_missing(conn, 'orders', '提交代碼', 'TEXT')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_token ON orders (提交代碼)")
+
+def _migration_order_sessions(conn):
+    # 同一天可以有多個訂餐場次（例如午餐與下午茶），各自有店家、開放與截止時間
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS order_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            名稱 TEXT NOT NULL,
+            店家名稱 TEXT NOT NULL,
+            日期 TEXT NOT NULL,
+            開放時間 TEXT NOT NULL DEFAULT '00:00',
+            截止時間 TEXT NOT NULL,
+            狀態 TEXT NOT NULL DEFAULT 'open',
+            預設 BOOLEAN NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_date_status ON order_sessions (日期, 狀態)")
+    # 每天最多一個由「今日店家／截止時間」設定產生的預設場次
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_default ON order_sessions (日期) WHERE 預設")
+    for table in ('orders', 'orders_archive'):
+        _add_column_if_missing(conn, table, 'session_id', 'INTEGER')
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_session ON {table} (session_id)")
+
+def _migration_orders_change_counter(conn):
+    # 訂單被修改或刪除時遞增 orders_version；新增訂單則由遞增的 id 判斷
+    conn.execute("INSERT OR IGNORE INTO config (key, value) VALUES ('orders_version', '0')")
+    for event in ('UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_orders_{event.lower()}_version AFTER {event} ON orders
+            BEGIN
+                UPDATE config SET value = CAST(value AS INTEGER) + 1 WHERE key = 'orders_version';
+            END
+        ''')
+
+def _migration_name_time_indexes(conn):
+    # 個人訂單紀錄依 (姓名, 時間) 查詢最近一筆與某段期間的訂單；原本的姓名索引是它的前綴，可以移除
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_name_time ON orders (姓名, 時間)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_archive_name_time ON orders_archive (姓名, 時間)")
+    conn.execute("DROP INDEX IF EXISTS idx_orders_name")
+    conn.execute("DROP INDEX IF EXISTS idx_orders_archive_name")
+
+def _migration_order_options(conn):
+    # 各店家的加點選項（加飯、不要辣…）與加價；訂單記下選項名稱與每份的加價總和，之後修改選項不影響舊訂單
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS item_options (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            store_id INTEGER NOT NULL REFERENCES stores (id) ON DELETE CASCADE,
+            選項 TEXT NOT NULL,
+            加價 INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (store_id, 選項)
+        )
+    ''')
+    for table in ('orders', 'orders_archive'):
+        _add_column_if_missing(conn, table, '選項', "TEXT DEFAULT ''")
+        _add_column_if_missing(conn, table, '加價', 'INTEGER DEFAULT 0')
+
+def _migration_store_rotation_and_closed_sessions(conn):
+    # 每週輪替的今日店家（星期一 = 0）；並由資料庫拒絕寫入已關閉場次的訂單，不只靠畫面判斷
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS store_rotation (
+            星期 INTEGER PRIMARY KEY CHECK (星期 BETWEEN 0 AND 6),
+            店家名稱 TEXT NOT NULL
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_orders_session_open BEFORE INSERT ON orders
+        WHEN NEW.session_id IS NOT NULL AND NOT EXISTS (
+            SELECT 1 FROM order_sessions WHERE id = NEW.session_id AND 狀態 = 'open'
+        )
+        BEGIN
+            SELECT RAISE(ABORT, '{SESSION_CLOSED_ERROR}');
+        END
+    ''')
+
+def _migration_archive_order_token(conn):
+    # 舊版檔案匯入的歷史訂單以提交代碼標記來源；升級上來的資料庫在遷移 6 只替 orders 加了這個欄位
+    _add_column_if_missing(conn, 'orders_archive', '提交代碼', 'TEXT')
+
+def _migration_global_cutoff_trigger(conn):
+    # 沒有場次的訂單依 config 的截止時間（未設定時為 08:50）由資料庫拒絕，與 submit_order 的判斷相同
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_orders_global_cutoff BEFORE INSERT ON orders
+        WHEN NEW.session_id IS NULL AND substr(NEW.時間, 12, 8) > substr(
+            COALESCE((SELECT value FROM config WHERE key = 'cutoff_time'), '08:50') || ':00', 1, 8
+        )
+        BEGIN
+            SELECT RAISE(ABORT, '{SESSION_CLOSED_ERROR}');
+        END
+    ''')
+
+# 依序執行的結構遷移：(版本, 說明, 函數)，已套用的版本記錄在 schema_version
+MIGRATIONS = [
+    (1, '建立 orders / menus / config 資料表', _migration_base_tables),
+    (2, '新增訂單日期欄位與查詢索引', _migration_date_column_and_indexes),
+    (3, '新增歷史訂單封存表 orders_archive', _migration_orders_archive),
+    (4, '菜單品項依 (店家名稱, 便當品項) 唯一', _migration_menu_item_key),
+    (5, '拆分 stores / menu_items 正規化資料表', _migration_stores_and_menu_items),
+    (6, '新增訂單提交代碼與唯一索引', _migration_order_token),
+    (7, '新增訂餐場次 order_sessions 與訂單 session_id', _migration_order_sessions),
+    (8, '新增訂單異動計數器 orders_version', _migration_orders_change_counter),
+    (9, '訂單與歷史訂單改用 (姓名, 時間) 複合索引', _migration_name_time_indexes),
+    (10, '新增加點選項 item_options 與訂單選項、加價欄位', _migration_order_options),
+    (11, '新增每週店家輪替與拒絕已關閉場次訂單的觸發器', _migration_store_rotation_and_closed_sessions),
+    (12, '歷史訂單新增提交代碼欄位', _migration_archive_order_token),
+    (13, '沒有場次的訂單超過截止時間時由觸發器拒絕', _migration_global_cutoff_trigger),
+]
+
+def _apply_migrations(conn):
+    """在單一交易中依序套用尚未執行的結構遷移"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TEXT
+            )
+        ''')
+        current = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+        for version, description, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            migrate(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, datetime('now'))",
+                (version, description)
+            )
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+# --- 菜單與設定快取 ---
+# 讀取結果依各租戶 config 表中的 config_version 快取；任何寫入都會遞增版本號，
+# 其他伺服器行程最晚在 CACHE_TTL_SECONDS 秒後就會看到變更。
+# 所有租戶共用同一份快取，最多保留 CACHE_MAX_TENANTS 個租戶，超過時移除最久沒用的。
+
+_cache_lock = threading.Lock()
+_tenant_caches = OrderedDict()
+
+def get_config_version():
+    """讀取目前的菜單／設定版本號"""
+    with get_connection() as conn:
+        result = conn.execute("SELECT value FROM config WHERE key = 'config_version'").fetchone()
+    return int(result[0]) if result else 0
+
+def _tenant_cache(tenant_id):
+    """取得租戶的快取區塊（呼叫時須持有 _cache_lock）"""
+    cache = _tenant_caches.get(tenant_id)
+    if cache is None:
+        cache = _tenant_caches[tenant_id] = {'version': None, 'checked_at': 0.0, 'entries': {}}
+        while len(_tenant_caches) > CACHE_MAX_TENANTS:
+            _tenant_caches.popitem(last=False)
+    else:
+        _tenant_caches.move_to_end(tenant_id)
+    return cache
+
+def _current_config_version(tenant_id):
+    """回傳版本號，TTL 內直接使用上次確認的結果"""
+    now = _time.monotonic()
+    with _cache_lock:
+        cache = _tenant_cache(tenant_id)
+        if now - cache['checked_at'] < CACHE_TTL_SECONDS:
+            return cache['version']
+    version = get_config_version()
+    with _cache_lock:
+        cache = _tenant_cache(tenant_id)
+        if cache['version'] != version:
+            cache['entries'].clear()
+        cache['version'] = version
+        cache['checked_at'] = now
+    return version
+
+def _cached(key, loader):
+    """以目前租戶的版本號為依據快取 loader() 的結果"""
+    tenant_id = current_tenant()
+    version = _current_config_version(tenant_id)
+    with _cache_lock:
+        entry = _tenant_cache(tenant_id)['entries'].get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    value = loader()
+    with _cache_lock:
+        _tenant_cache(tenant_id)['entries'][key] = (version, value)
+    return value
+
+def invalidate_cache(tenant_id=None):
+    """清除本行程中目前（或指定）租戶的菜單／設定快取"""
+    tenant_id = current_tenant() if tenant_id is None else tenant_id
+    with _cache_lock:
+        _tenant_caches.pop(tenant_id, None)
+
+@contextmanager
+def config_transaction():
+    """寫入菜單或設定用的交易：遞增版本號，提交後清除本機快取"""
+    with transaction() as conn:
+        yield conn
+        conn.execute(
+            "INSERT INTO config (key, value) VALUES ('config_version', '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+    invalidate_cache()
 
 # --- 訂單相關函數 ---
 
-def load_orders_from_db():
-    """從資料庫讀取所有訂單"""
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM orders", conn)
-    conn.close()
+ORDER_COLUMNS = ('id', '姓名', '店家名稱', '便當品項', '價格', '數量', '選項', '加價', '備註', '時間', '已付款', '選取', '刪除', '日期', 'session_id')
+
+# 管理頁面可直接編輯的訂單欄位
+EDITABLE_ORDER_COLUMNS = ('姓名', '店家名稱', '便當品項', '價格', '數量', '選項', '加價', '備註', '已付款', '選取', '刪除')
+
+def now_tw():
+    """回傳目前的台灣時間（伺服器時間加 8 小時）"""
+    return datetime.utcnow() + timedelta(hours=8)
+
+def _session_filter(session_id):
+    """回傳依訂餐場次篩選的 WHERE 子句與參數（session_id 為 None 時不篩選）"""
+    if session_id is None:
+        return "", ()
+    return "WHERE session_id = ?", (int(session_id),)
+
+@instrumented
+def load_orders_from_db(session_id=None):
+    """從資料庫讀取尚未封存的訂單，可只讀取指定訂餐場次"""
+    import pandas as pd
+    where, params = _session_filter(session_id)
+    with get_connection() as conn:
+        df = pd.read_sql_query(f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders {where}", conn, params=params)
     if df.empty:
-        return pd.DataFrame(columns=['id', '姓名', '店家名稱', '便當品項', '價格', '數量', '備註', '時間', '已付款', '選取', '刪除'])
+        return pd.DataFrame(columns=list(ORDER_COLUMNS))
     return df
 
-def save_orders_to_db(df):
-    """將訂單 DataFrame 寫入資料庫，覆蓋舊資料"""
-    conn = sqlite3.connect(DB_PATH)
-    df.to_sql('orders', conn, if_exists='replace', index=False)
-    conn.close()
+# 訂單總覽可排序的欄位（排序欄位會直接放進 SQL，只接受這些）
+ORDER_SORT_COLUMNS = ('時間', '姓名', '店家名稱', '便當品項', '價格', '數量', '已付款', 'id')
 
-def save_new_order_to_db(name, store_name, item, price):
-    """將單筆新訂單添加到資料庫"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # 確保價格是數字，避免寫入錯誤值
+@instrumented
+def load_orders_page(page=0, page_size=50, session_id=None, name_contains=None, store_name=None,
+                     unpaid_only=False, day=None, sort_by='時間', descending=False):
+    """依條件在資料庫中篩選、排序並分頁讀取尚未封存的訂單，回傳 (DataFrame, 符合條件的總筆數)"""
+    import pandas as pd
+    if sort_by not in ORDER_SORT_COLUMNS:
+        raise ValueError(f"無法依「{sort_by}」排序")
+    conditions, params = [], []
+    if session_id is not None:
+        conditions.append("session_id = ?")
+        params.append(int(session_id))
+    if name_contains:
+        escaped = name_contains.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        conditions.append("姓名 LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+    if store_name:
+        conditions.append("店家名稱 = ?")
+        params.append(store_name)
+    if unpaid_only:
+        conditions.append("NOT COALESCE(已付款, 0)")
+    if day:
+        conditions.append("日期 = ?")
+        params.append(str(day))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    direction = "DESC" if descending else "ASC"
+
+    with get_connection() as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM orders {where}", params).fetchone()[0]
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders {where} "
+            f"ORDER BY {sort_by} {direction}, id {direction} LIMIT ? OFFSET ?",
+            conn, params=(*params, int(page_size), int(page) * int(page_size))
+        )
+    return df, total
+
+# 單筆訂單最多幾份
+ORDER_MAX_QUANTITY = 20
+
+def _order_quantity(quantity):
+    """將數量限制在 1 ~ ORDER_MAX_QUANTITY 之間，無法轉換時視為 1"""
+    try:
+        quantity = int(quantity)
+    except (ValueError, TypeError):
+        return 1
+    return min(max(quantity, 1), ORDER_MAX_QUANTITY)
+
+# --- 訂單送出佇列 ---
+# 所有訂單交給單一寫入執行緒，幾毫秒內送達的訂單合併成一個交易；
+# 提交代碼相同的訂單只會寫入一次，截止時間則在交易中以資料庫內的設定再檢查一次。
+# 以 item_id 送出時，品項名稱、價格與店家都在寫入當下由 menu_items 讀取，不信任畫面上的值。
+
+ORDER_CREATED = 'created'
+ORDER_DUPLICATE = 'duplicate'
+ORDER_CLOSED = 'closed'
+ORDER_UNAVAILABLE = 'unavailable'
+
+# 觸發器拒絕寫入已關閉場次時的錯誤訊息
+SESSION_CLOSED_ERROR = 'order session closed'
+
+# 收集同一批訂單的等待時間（秒）與每批上限
+ORDER_BATCH_WINDOW_SECONDS = 0.005
+ORDER_BATCH_MAX_SIZE = 200
+
+_order_queue = queue.Queue()
+_order_writer_lock = threading.Lock()
+_order_writer = {'thread': None}
+
+def new_order_token():
+    """產生新的訂單提交代碼"""
+    return uuid.uuid4().hex
+
+@instrumented
+def submit_order(name, store_name, item=None, price=None, token=None, session_id=None, timeout=10, item_id=None,
+                 quantity=1, option_ids=()):
+    """送出訂單並等待寫入結果：ORDER_CREATED、ORDER_DUPLICATE、ORDER_CLOSED 或 ORDER_UNAVAILABLE
+
+    指定 session_id 時依該場次的狀態與開放／截止時間判斷，否則依全域截止時間。
+    指定 item_id 時忽略 store_name / item / price，改用菜單中的資料；品項已不存在或
+    不屬於該場次的店家時回傳 ORDER_UNAVAILABLE。option_ids 為加點選項 id，名稱與加價
+    同樣在寫入時讀取，選項不存在或不屬於該店家時也回傳 ORDER_UNAVAILABLE。
+    """
     try:
         price = int(price)
     except (ValueError, TypeError):
         price = 0
-        
-    # 儲存為本地時區的時間
-    local_time = (datetime.utcnow() + timedelta(hours=8)).strftime("%Y-%m-%d %H:%M:%S")
-    
-    order_data = (name, store_name, item, price, 1, '', local_time, 0, 0, 0)
-    c.execute("INSERT INTO orders (姓名, 店家名稱, 便當品項, 價格, 數量, 備註, 時間, 已付款, 選取, 刪除) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", order_data)
-    
-    conn.commit()
-    conn.close()
 
-def update_orders_in_db(df):
-    """更新整個訂單表格"""
-    conn = sqlite3.connect(DB_PATH)
-    df.to_sql('orders', conn, if_exists='replace', index=False)
-    conn.close()
+    order = (name, store_name, item, price, token or new_order_token(), session_id, item_id,
+             _order_quantity(quantity), tuple(sorted({int(option_id) for option_id in option_ids})))
+    future = Future()
+    _order_queue.put((current_tenant(), order, future))
+    _ensure_order_writer()
+    return future.result(timeout=timeout)
+
+def _ensure_order_writer():
+    """需要時才啟動寫入執行緒（每個行程一條）"""
+    with _order_writer_lock:
+        thread = _order_writer['thread']
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_order_writer_loop, name='lunch-order-writer', daemon=True)
+            _order_writer['thread'] = thread
+            thread.start()
+
+def _order_writer_loop():
+    while True:
+        batch = [_order_queue.get()]
+        deadline = _time.monotonic() + ORDER_BATCH_WINDOW_SECONDS
+        while len(batch) < ORDER_BATCH_MAX_SIZE:
+            remaining = deadline - _time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_order_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _write_order_batch(batch)
+
+def _write_order_batch(batch):
+    """依租戶分組，各以單一交易寫入，提交後再通知每個等待中的請求"""
+    by_tenant = OrderedDict()
+    for tenant_id, order, future in batch:
+        by_tenant.setdefault(tenant_id, []).append((order, future))
 
+    for tenant_id, requests in by_tenant.items():
+        try:
+            with tenant_context(tenant_id):
+                results = _insert_orders(requests)
+        except Exception as e:
+            for _, future in requests:
+                future.set_exception(e)
+            continue
+        for (_, future), result in zip(requests, results):
+            future.set_result(result)
+
+@instrumented
+def _insert_orders(requests):
+    results = []
+    with transaction() as conn:
+        now = now_tw()
+        global_closed = now > datetime.combine(now.date(), _read_cutoff_time())
+        sessions = {}
+        menu_items = {}
+        local_time = now.strftime("%Y-%m-%d %H:%M:%S")
+        for (name, store_name, item, price, token, session_id, item_id, quantity, option_ids), _ in requests:
+            if session_id is None:
+                session = None
+                closed = global_closed
+            else:
+                if session_id not in sessions:
+                    sessions[session_id] = _read_session(session_id)
+                session = sessions[session_id]
+                closed = not _session_accepts_orders(session, now)
+            if closed:
+                results.append(ORDER_CLOSED)
+                continue
+            if item_id is not None:
+                if item_id not in menu_items:
+                    menu_items[item_id] = conn.execute(
+                        "SELECT s.店家名稱, m.便當品項, m.價格 FROM menu_items m JOIN stores s ON s.id = m.store_id "
+                        "WHERE m.id = ?", (int(item_id),)
+                    ).fetchone()
+                menu_item = menu_items[item_id]
+                if menu_item is None or (session is not None and menu_item[0] != session['店家名稱']):
+                    results.append(ORDER_UNAVAILABLE)
+                    continue
+                store_name, item, price = menu_item
+            options, extra_price = '', 0
+            if option_ids:
+                option_rows = conn.execute(
+                    "SELECT s.店家名稱, o.選項, o.加價 FROM item_options o JOIN stores s ON s.id = o.store_id "
+                    f"WHERE o.id IN ({', '.join('?' * len(option_ids))}) ORDER BY o.id", option_ids
+                ).fetchall()
+                if len(option_rows) != len(option_ids) or any(row[0] != store_name for row in option_rows):
+                    results.append(ORDER_UNAVAILABLE)
+                    continue
+                options = '、'.join(row[1] for row in option_rows)
+                extra_price = sum(row[2] for row in option_rows)
+            try:
+                cursor = conn.execute(
+                    "INSERT INTO orders (姓名, 店家名稱, 便當品項, 價格, 數量, 選項, 加價, 備註, 時間, 已付款, 選取, 刪除, 日期, 提交代碼, session_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, '', ?, 0, 0, 0, ?, ?, ?) "
+                    "ON CONFLICT (提交代碼) DO NOTHING",
+                    (name, store_name, item, price, quantity, options, extra_price, local_time, local_time[:10], token, session_id)
+                )
+            except sqlite3.IntegrityError as e:
+                # 只有這筆被觸發器擋下，同一批的其他訂單照常寫入
+                if SESSION_CLOSED_ERROR not in str(e):
+                    raise
+                results.append(ORDER_CLOSED)
+                continue
+            results.append(ORDER_CREATED if cursor.rowcount else ORDER_DUPLICATE)
+    return results
+
+def collect_order_changes(orders_df, edited_rows):
+    """將 st.data_editor 的 edited_rows 轉換為 {訂單 id: {欄位: 新值}}，只保留實際變動的欄位"""
+    changes = {}
+    for row_pos, cols in edited_rows.items():
+        row_pos = int(row_pos)
+        if row_pos >= len(orders_df):
+            continue
+        original = orders_df.iloc[row_pos]
+        changed = {
+            col: value for col, value in cols.items()
+            if col in EDITABLE_ORDER_COLUMNS and original[col] != value
+        }
+        if changed:
+            changes[int(original['id'])] = changed
+    return changes
+
+@instrumented
+def apply_order_changes(changes, deleted_ids=()):
+    """以單一交易套用逐列的 UPDATE 與 DELETE，只寫入有變動的欄位"""
+    with transaction() as conn:
+        for order_id, cols in changes.items():
+            cols = {col: _to_sql_value(v) for col, v in cols.items() if col in EDITABLE_ORDER_COLUMNS}
+            if not cols:
+                continue
+            assignments = ', '.join(f"{col} = ?" for col in cols)
+            conn.execute(f"UPDATE orders SET {assignments} WHERE id = ?", (*cols.values(), int(order_id)))
+        if deleted_ids:
+            conn.executemany("DELETE FROM orders WHERE id = ?", [(int(oid),) for oid in deleted_ids])
+
+def _to_sql_value(value):
+    """將 numpy / pandas 純量轉為 sqlite3 可接受的 Python 型別"""
+    import pandas as pd
+    if hasattr(value, 'item'):
+        value = value.item()
+    if value is None or (not isinstance(value, (str, bytes)) and pd.isna(value)):
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+@instrumented
 def clear_all_orders_in_db():
     """清除所有訂單資料"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM orders")
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("DELETE FROM orders")
 
+@instrumented
 def delete_orders_from_db(order_ids):
     """根據 ID 刪除訂單"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.executemany("DELETE FROM orders WHERE id = ?", [(oid,) for oid in order_ids])
-    conn.commit()
-    conn.close()
-
-# --- 菜單相關函數 ---
-
-def load_menus_from_db():
-    """從資料庫讀取所有菜單"""
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM menus", conn)
-    conn.close()
-    if df.empty:
-        return pd.DataFrame(columns=['id', '店家名稱', '店家地址', '店家電話', '便當品項', '價格'])
-    return df
+    with transaction() as conn:
+        conn.executemany("DELETE FROM orders WHERE id = ?", [(oid,) for oid in order_ids])
+
+@instrumented
+def fetch_order_count(user_name):
+    """查詢某使用者的訂單數量"""
+    with get_connection() as conn:
+        count = conn.execute("SELECT COUNT(*) FROM orders WHERE 姓名 = ?", (user_name,)).fetchone()[0]
+    return count
+
+# --- 個人訂單紀錄 ---
+# 進行中與已封存的訂單都依 (姓名, 時間) 建立索引，查詢成本只和該使用者的筆數有關。
+
+USER_ORDER_COLUMNS = ('時間', '店家名稱', '便當品項', '選項', '價格', '加價', '數量', '已付款')
+
+@instrumented
+def load_last_order(user_name):
+    """讀取某使用者最近一筆訂單（找不到時再查歷史訂單），沒有任何訂單時回傳 None"""
+    for table in ('orders', 'orders_archive'):
+        with get_connection() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(USER_ORDER_COLUMNS)} FROM {table} WHERE 姓名 = ? ORDER BY 時間 DESC LIMIT 1",
+                (user_name,)
+            ).fetchone()
+        if row:
+            return dict(zip(USER_ORDER_COLUMNS, row))
+    return None
+
+@instrumented
+def load_user_month_orders(user_name, day=None):
+    """讀取某使用者在 day（預設今天）所在月份的所有訂單（含歷史訂單），新到舊，附小計"""
+    day = day or now_tw().date()
+    month_start = day.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    part = (f"SELECT {', '.join(USER_ORDER_COLUMNS)}, {LINE_TOTAL_SQL} AS 小計 FROM {{table}} "
+            "WHERE 姓名 = ? AND 時間 >= ? AND 時間 < ?")
+    params = (user_name, month_start.isoformat(), next_month.isoformat())
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"{part.format(table='orders')} UNION ALL {part.format(table='orders_archive')} ORDER BY 時間 DESC",
+            params * 2
+        ).fetchall()
+    orders = [dict(zip(USER_ORDER_COLUMNS + ('小計',), row)) for row in rows]
+    for order in orders:
+        order['已付款'] = bool(order['已付款'])
+    return orders
+
+# --- 即時看板 ---
 
-def update_menus_in_db(df):
-    """更新整個菜單表格"""
-    conn = sqlite3.connect(DB_PATH)
-    df.to_sql('menus', conn, if_exists='replace', index=False)
-    conn.close()
+LIVE_BOARD_COLUMNS = ('id', '時間', '姓名', '店家名稱', '便當品項', '選項', '價格', '加價', '數量', '已付款')
 
+@instrumented
+def fetch_orders_marker():
+    """回傳 (orders_version, 最大訂單 id)：前者在訂單被修改或刪除時改變，後者在有新訂單時變大"""
+    with get_connection() as conn:
+        version = conn.execute("SELECT value FROM config WHERE key = 'orders_version'").fetchone()
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM orders").fetchone()[0]
+    return (int(version[0]) if version else 0), max_id
+
+@instrumented
+def fetch_orders_since(last_id, session_id=None):
+    """只讀取 id 大於 last_id 的新訂單（依 id 排序），成本與新訂單數成正比"""
+    import pandas as pd
+    sql = f"SELECT {', '.join(LIVE_BOARD_COLUMNS)} FROM orders WHERE id > ?"
+    params = [int(last_id)]
+    if session_id is not None:
+        sql += " AND session_id = ?"
+        params.append(int(session_id))
+    with get_connection() as conn:
+        return pd.read_sql_query(sql + " ORDER BY id", conn, params=params)
+
+# --- 訂單彙總 ---
+
+# 單筆訂單金額：(單價 + 每份加價) × 份數
+LINE_TOTAL_SQL = "(COALESCE(價格, 0) + COALESCE(加價, 0)) * COALESCE(數量, 1)"
+
+@instrumented
+def fetch_order_summary(session_id=None):
+    """以 SQL 彙總訂單筆數、份數與總金額、已付款／未付款與已選取金額"""
+    where, params = _session_filter(session_id)
+    with get_connection() as conn:
+        row = conn.execute(f'''
+            SELECT
+                COUNT(*),
+                COALESCE(SUM(COALESCE(數量, 1)), 0),
+                COALESCE(SUM({LINE_TOTAL_SQL}), 0),
+                COALESCE(SUM(CASE WHEN 已付款 THEN {LINE_TOTAL_SQL} ELSE 0 END), 0),
+                COALESCE(SUM(CASE WHEN 選取 THEN {LINE_TOTAL_SQL} ELSE 0 END), 0)
+            FROM orders
+            {where}
+        ''', params).fetchone()
+    count, quantity, total, paid, selected = row
+    return {
+        '訂單數': count,
+        '份數': quantity,
+        '總金額': total,
+        '已付款': paid,
+        '未付款': total - paid,
+        '已選取': selected,
+    }
+
+@instrumented
+def fetch_item_counts(session_id=None):
+    """各店家、便當品項與選項組合的份數與金額（訂購時打電話給店家用）"""
+    where, params = _session_filter(session_id)
+    with get_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT 店家名稱, 便當品項, COALESCE(選項, ''), SUM(COALESCE(數量, 1)), SUM({LINE_TOTAL_SQL})
+            FROM orders
+            {where}
+            GROUP BY 店家名稱, 便當品項, COALESCE(選項, '')
+            ORDER BY 店家名稱, SUM(COALESCE(數量, 1)) DESC, 便當品項, COALESCE(選項, '')
+        ''', params).fetchall()
+    return [
+        {'店家名稱': store, '便當品項': item, '選項': options, '份數': quantity, '金額': amount}
+        for store, item, options, quantity, amount in rows
+    ]
+
+@instrumented
+def fetch_person_balances(session_id=None):
+    """每個人的訂單金額、已付款與未付款金額（未付款多者在前）"""
+    where, params = _session_filter(session_id)
+    with get_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT
+                姓名,
+                SUM({LINE_TOTAL_SQL}),
+                SUM(CASE WHEN 已付款 THEN {LINE_TOTAL_SQL} ELSE 0 END)
+            FROM orders
+            {where}
+            GROUP BY 姓名
+        ''', params).fetchall()
+    balances = [
+        {'姓名': name, '金額': total, '已付款': paid, '未付款': total - paid}
+        for name, total, paid in rows
+    ]
+    balances.sort(key=lambda b: (-b['未付款'], b['姓名'] or ''))
+    return balances
+
+# --- 訂單匯出 ---
+
+EXPORT_COLUMNS = ('日期', '時間', '姓名', '店家名稱', '便當品項', '價格', '選項', '加價', '數量', '小計', '備註', '已付款')
+
+# 匯出時每次從游標取出的列數
+EXPORT_CHUNK_SIZE = 500
+# 網頁下載會把整個檔案放在記憶體中再送出，超過這個筆數請改用 maintenance.py export 直接寫到檔案
+EXPORT_DOWNLOAD_MAX_ROWS = 100_000
+
+def _export_filter(start_date=None, end_date=None, store_name=None):
+    """匯出條件的 WHERE 子句與參數"""
+    conditions, params = [], []
+    if start_date:
+        conditions.append("日期 >= ?")
+        params.append(str(start_date))
+    if end_date:
+        conditions.append("日期 <= ?")
+        params.append(str(end_date))
+    if store_name:
+        conditions.append("店家名稱 = ?")
+        params.append(store_name)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+@instrumented
+def count_export_rows(start_date=None, end_date=None, store_name=None):
+    """符合匯出條件的訂單筆數（歷史訂單加目前訂單）"""
+    where, params = _export_filter(start_date, end_date, store_name)
+    with get_connection() as conn:
+        return sum(
+            conn.execute(f"SELECT COUNT(*) FROM {table} {where}", params).fetchone()[0]
+            for table in ('orders_archive', 'orders')
+        )
+
+def _iter_export_chunks(conn, start_date=None, end_date=None, store_name=None):
+    """依日期與店家條件，先歷史訂單、後目前訂單，分批產生資料列"""
+    where, params = _export_filter(start_date, end_date, store_name)
+    select_list = ', '.join(LINE_TOTAL_SQL if column == '小計' else column for column in EXPORT_COLUMNS)
+    for table in ('orders_archive', 'orders'):
+        cursor = conn.execute(
+            f"SELECT {select_list} FROM {table} {where} ORDER BY 日期, id", params
+        )
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            yield rows
+
+def write_orders_csv(fp, start_date=None, end_date=None, store_name=None):
+    """將訂單以 CSV（含 UTF-8 BOM，Excel 可正確顯示中文）分批寫入二進位檔案物件"""
+    fp.write(b'\xef\xbb\xbf')
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    with get_connection() as conn:
+        for rows in _iter_export_chunks(conn, start_date, end_date, store_name):
+            writer.writerows(rows)
+            fp.write(buffer.getvalue().encode('utf-8'))
+            buffer.seek(0)
+            buffer.truncate()
+    fp.write(buffer.getvalue().encode('utf-8'))
+
+def write_orders_xlsx(fp, start_date=None, end_date=None, store_name=None):
+    """將訂單以 XLSX 分批寫入二進位檔案物件（需要 openpyxl）"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("訂單")
+    sheet.append(EXPORT_COLUMNS)
+    with get_connection() as conn:
+        for rows in _iter_export_chunks(conn, start_date, end_date, store_name):
+            for row in rows:
+                sheet.append(row)
+    workbook.save(fp)
+
+@instrumented
+def export_orders(file_format='csv', start_date=None, end_date=None, store_name=None):
+    """產生匯出檔並回傳檔案內容（bytes），st.download_button 可直接使用
+
+    整個檔案會放在記憶體中，只適合 EXPORT_DOWNLOAD_MAX_ROWS 筆以內的匯出；
+    更大的範圍請用 write_orders_csv / write_orders_xlsx 直接寫到檔案（maintenance.py export）。
+    """
+    writer = write_orders_xlsx if file_format == 'xlsx' else write_orders_csv
+    fp = io.BytesIO()
+    writer(fp, start_date, end_date, store_name)
+    return fp.getvalue()
+
+# --- 訂單封存 ---
+
+# 各租戶最後一次封存的日期
+_rollover_dates = {}
+
+@instrumented
+def archive_orders_before(day_str):
+    """將指定日期（不含當天）以前的訂單搬移到 orders_archive，回傳搬移筆數"""
+    col_list = ', '.join(ORDER_COLUMNS)
+    with transaction() as conn:
+        conn.execute(
+            f"INSERT INTO orders_archive ({col_list}) SELECT {col_list} FROM orders WHERE 日期 < ?",
+            (day_str,)
+        )
+        moved = conn.execute("DELETE FROM orders WHERE 日期 < ?", (day_str,)).rowcount
+        conn.execute("REPLACE INTO config (key, value) VALUES ('last_archive_date', ?)", (day_str,))
+    return moved
+
+def maybe_rollover_orders(now=None):
+    """每天第一次執行時（排程在午夜後的第一次檢查）把前幾天的訂單封存，訂單表只留今天的訂單；回傳搬移筆數"""
+    now = now or now_tw()
+    today_str = now.date().isoformat()
+    if _rollover_dates.get(current_tenant()) == today_str:
+        return 0
+
+    moved = archive_orders_before(today_str)
+    _rollover_dates[current_tenant()] = today_str
+    return moved
+
+@instrumented
+def load_archived_orders(page=0, page_size=50, start_date=None, end_date=None):
+    """分頁讀取歷史訂單（新到舊），回傳 (DataFrame, 總筆數)"""
+    import pandas as pd
+    conditions, params = [], []
+    if start_date:
+        conditions.append("日期 >= ?")
+        params.append(str(start_date))
+    if end_date:
+        conditions.append("日期 <= ?")
+        params.append(str(end_date))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with get_connection() as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM orders_archive {where}", params).fetchone()[0]
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders_archive {where} ORDER BY 日期 DESC, id DESC LIMIT ? OFFSET ?",
+            conn, params=(*params, page_size, page * page_size)
+        )
+    return df, total
+
+# --- 店家與菜單相關函數 ---
+
+@instrumented
+def load_store_names(active_only=True):
+    """讀取店家名稱清單（依名稱排序）"""
+    return list(_cached(('store_names', active_only), lambda: _read_store_names(active_only)))
+
+def _read_store_names(active_only):
+    where = "WHERE 啟用" if active_only else ""
+    with get_connection() as conn:
+        rows = conn.execute(f"SELECT 店家名稱 FROM stores {where} ORDER BY 店家名稱").fetchall()
+    return tuple(row[0] for row in rows)
+
+@instrumented
+def load_store(store_name):
+    """讀取單一店家的基本資料，找不到時回傳 None"""
+    store = _cached(('store', store_name), lambda: _read_store(store_name))
+    return dict(store) if store else None
+
+def _read_store(store_name):
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT id, 店家名稱, 店家地址, 店家電話, 啟用 FROM stores WHERE 店家名稱 = ?", (store_name,)
+        ).fetchone()
+    if row is None:
+        return None
+    return {'id': row[0], '店家名稱': row[1], '店家地址': row[2] or '', '店家電話': row[3] or '', '啟用': bool(row[4])}
+
+@instrumented
+def load_menu_index(store_name):
+    """回傳店家菜單的 {品項 id: (便當品項, 價格)}（依菜單順序），每個菜單版本只建立一次；回傳的是共用快取，請勿修改"""
+    return _cached(
+        ('menu_index', store_name),
+        lambda: {item_id: (item, price) for item_id, item, price in _read_store_menu(store_name)}
+    )
+
+@instrumented
+def load_store_menu(store_name):
+    """依店家名稱讀取該店家的菜單（id、便當品項、價格），只查詢該店家的品項"""
+    import pandas as pd
+    rows = _cached(('store_menu', store_name), lambda: _read_store_menu(store_name))
+    return pd.DataFrame(rows, columns=['id', '便當品項', '價格'])
+
+def _read_store_menu(store_name):
+    with get_connection() as conn:
+        rows = conn.execute(
+            '''
+                SELECT m.id, m.便當品項, m.價格
+                FROM menu_items m JOIN stores s ON s.id = m.store_id
+                WHERE s.店家名稱 = ?
+                ORDER BY m.id
+            ''',
+            (store_name,)
+        ).fetchall()
+    return tuple((item_id, item, int(price or 0)) for item_id, item, price in rows)
+
+@instrumented
+def add_store(store_name, address='', phone=''):
+    """新增店家，名稱重複時不做任何事；回傳是否新增成功"""
+    with config_transaction() as conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO stores (店家名稱, 店家地址, 店家電話) VALUES (?, ?, ?)",
+            (store_name, address, phone)
+        )
+    return cursor.rowcount > 0
+
+@instrumented
+def save_store_menu(store_name, address, phone, items_df):
+    """以單一交易更新一家店的資料與菜單；保留既有品項的 id，只動到這家店的資料列"""
+    items = {}
+    for item, price in zip(items_df['便當品項'], items_df['價格']):
+        item = str(item).strip() if item is not None else ''
+        if item:
+            items[item] = int(_to_sql_value(price) or 0)
+
+    with config_transaction() as conn:
+        conn.execute(
+            "INSERT INTO stores (店家名稱, 店家地址, 店家電話) VALUES (?, ?, ?) "
+            "ON CONFLICT (店家名稱) DO UPDATE SET 店家地址 = excluded.店家地址, 店家電話 = excluded.店家電話",
+            (store_name, address, phone)
+        )
+        store_id = conn.execute("SELECT id FROM stores WHERE 店家名稱 = ?", (store_name,)).fetchone()[0]
+        existing = [row[0] for row in conn.execute("SELECT 便當品項 FROM menu_items WHERE store_id = ?", (store_id,))]
+        conn.executemany(
+            "DELETE FROM menu_items WHERE store_id = ? AND 便當品項 = ?",
+            [(store_id, item) for item in existing if item not in items]
+        )
+        conn.executemany(
+            "INSERT INTO menu_items (store_id, 便當品項, 價格) VALUES (?, ?, ?) "
+            "ON CONFLICT (store_id, 便當品項) DO UPDATE SET 價格 = excluded.價格",
+            [(store_id, item, price) for item, price in items.items()]
+        )
+
+@instrumented
+def load_option_index(store_name):
+    """回傳店家加點選項的 {選項 id: (選項, 加價)}，依菜單版本快取；回傳的是共用快取，請勿修改"""
+    return _cached(('option_index', store_name), lambda: _read_item_options(store_name))
+
+def _read_item_options(store_name):
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT o.id, o.選項, o.加價 FROM item_options o JOIN stores s ON s.id = o.store_id "
+            "WHERE s.店家名稱 = ? ORDER BY o.id",
+            (store_name,)
+        ).fetchall()
+    return {option_id: (option, int(extra_price or 0)) for option_id, option, extra_price in rows}
+
+@instrumented
+def save_store_options(store_name, options_df):
+    """以單一交易更新一家店的加點選項（選項、加價）；店家不存在時不做任何事"""
+    options = {}
+    for option, extra_price in zip(options_df['選項'], options_df['加價']):
+        option = str(option).strip() if option is not None else ''
+        if option:
+            options[option] = int(_to_sql_value(extra_price) or 0)
+
+    with config_transaction() as conn:
+        row = conn.execute("SELECT id FROM stores WHERE 店家名稱 = ?", (store_name,)).fetchone()
+        if row is None:
+            return
+        store_id = row[0]
+        existing = [row[0] for row in conn.execute("SELECT 選項 FROM item_options WHERE store_id = ?", (store_id,))]
+        conn.executemany(
+            "DELETE FROM item_options WHERE store_id = ? AND 選項 = ?",
+            [(store_id, option) for option in existing if option not in options]
+        )
+        conn.executemany(
+            "INSERT INTO item_options (store_id, 選項, 加價) VALUES (?, ?, ?) "
+            "ON CONFLICT (store_id, 選項) DO UPDATE SET 加價 = excluded.加價",
+            [(store_id, option, extra_price) for option, extra_price in options.items()]
+        )
+
+@instrumented
+def set_store_active(store_name, active):
+    """啟用或停用店家（停用的店家不會出現在今日店家選單）"""
+    with config_transaction() as conn:
+        conn.execute("UPDATE stores SET 啟用 = ? WHERE 店家名稱 = ?", (int(bool(active)), store_name))
+
+@instrumented
 def delete_store_from_db(store_name):
     """從資料庫中刪除指定的店家及其所有菜單項目"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM menus WHERE 店家名稱 = ?", (store_name,))
-    conn.commit()
-    conn.close()
+    with config_transaction() as conn:
+        conn.execute("DELETE FROM stores WHERE 店家名稱 = ?", (store_name,))
 
-def fetch_order_count(user_name):
-    """查詢某使用者的訂單數量"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM orders WHERE 姓名 = ?", (user_name,))
-    count = c.fetchone()[0]
-    conn.close()
-    return count
+# --- 菜單批次匯入 ---
+
+# 匯入檔案的欄位別名
+MENU_IMPORT_COLUMN_ALIASES = {
+    '便當品項': ('便當品項', '品項', '名稱', '品名', 'item', 'name'),
+    '價格': ('價格', '售價', '金額', 'price'),
+}
+
+# 讀取 CSV 時每次解析的列數
+MENU_IMPORT_CHUNK_ROWS = 1000
+
+MENU_IMPORT_COLUMNS_ERROR = "找不到「便當品項」與「價格」兩欄，請確認每行有品項與價格，並以逗號或 Tab 分隔"
+
+def _has_menu_import_header(first_row):
+    """第一列（文字或儲存格值）含有任一欄位別名時視為標題列"""
+    text = first_row if isinstance(first_row, str) else ' '.join(str(v) for v in first_row)
+    text = text.lower()
+    return any(alias in text for aliases in MENU_IMPORT_COLUMN_ALIASES.values() for alias in aliases)
+
+def _normalize_menu_import_columns(df):
+    """依別名找出品項與價格欄位；沒有可辨識的標題時取前兩欄，不足兩欄時丟出 ValueError"""
+    renamed = {}
+    for target, aliases in MENU_IMPORT_COLUMN_ALIASES.items():
+        for col in df.columns:
+            if str(col).strip().lower() in aliases and col not in renamed:
+                renamed[col] = target
+                break
+    if len(renamed) == 2:
+        return df.rename(columns=renamed)[['便當品項', '價格']]
+
+    if len(df.columns) < 2:
+        raise ValueError(MENU_IMPORT_COLUMNS_ERROR)
+    df = df.iloc[:, :2].copy()
+    df.columns = ['便當品項', '價格']
+    return df
+
+def _read_menu_csv(source, **kwargs):
+    """分批解析 CSV，只保留品項與價格兩欄"""
+    import pandas as pd
+    chunks = [
+        _normalize_menu_import_columns(chunk)
+        for chunk in pd.read_csv(source, dtype=str, chunksize=MENU_IMPORT_CHUNK_ROWS,
+                                 skip_blank_lines=True, **kwargs)
+    ]
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=['便當品項', '價格'])
+
+def _read_menu_text(text):
+    """解析 CSV 或從 Excel 複製的文字：第一行有 Tab 時以 Tab 分隔，其餘自動判斷；第一行有欄位名稱時才當作標題"""
+    text = text.strip()
+    if not text:
+        import pandas as pd
+        return pd.DataFrame(columns=['便當品項', '價格'])
+    first_line = text.splitlines()[0]
+    try:
+        return _read_menu_csv(
+            io.StringIO(text),
+            sep='\t' if '\t' in first_line else None,
+            engine='python',
+            header=0 if _has_menu_import_header(first_line) else None
+        )
+    except csv.Error:
+        # 只有一欄時無法判斷分隔符號
+        raise ValueError(MENU_IMPORT_COLUMNS_ERROR)
+
+def read_menu_import(uploaded_files=(), pasted_text=''):
+    """讀取上傳的 CSV / XLSX 檔案（可多個）或貼上的文字，回傳只有 便當品項、價格 兩欄的 DataFrame
+
+    找不到品項與價格兩欄或檔案無法解碼時丟出 ValueError。
+    """
+    import pandas as pd
+    frames = []
+    for uploaded in uploaded_files:
+        name = getattr(uploaded, 'name', '').lower()
+        if name.endswith('.xls'):
+            # 讀舊版 .xls 需要另外安裝 xlrd
+            raise ValueError(f"{uploaded.name} 是舊版 Excel 檔，請另存為 .xlsx 或 CSV 後再上傳")
+        if name.endswith('.xlsx'):
+            sheet = pd.read_excel(uploaded, dtype=str, header=None)
+            if not sheet.empty and _has_menu_import_header(sheet.iloc[0].fillna('')):
+                sheet = sheet.iloc[1:].set_axis(sheet.iloc[0].fillna(''), axis=1)
+            frames.append(_normalize_menu_import_columns(sheet))
+        else:
+            try:
+                text = uploaded.getvalue().decode('utf-8-sig')
+            except UnicodeDecodeError:
+                raise ValueError(f"{getattr(uploaded, 'name', 'CSV')} 不是 UTF-8 編碼，請另存為 UTF-8 CSV")
+            frames.append(_read_menu_text(text))
+
+    if pasted_text and pasted_text.strip():
+        frames.append(_read_menu_text(pasted_text))
+
+    if not frames:
+        return pd.DataFrame(columns=['便當品項', '價格'])
+    return pd.concat(frames, ignore_index=True)
+
+def validate_menu_import(df):
+    """向量化檢查品項名稱、價格與重複品項，回傳 (有效資料, 問題列表)"""
+    import pandas as pd
+    df = df.copy()
+    df['便當品項'] = df['便當品項'].fillna('').astype(str).str.strip()
+    prices = pd.to_numeric(df['價格'].astype(str).str.replace(r'[^\d.\-]', '', regex=True), errors='coerce')
+
+    problems = pd.Series('', index=df.index)
+    problems = problems.mask(df['便當品項'].isin(['', '無']), '品項名稱空白')
+    problems = problems.mask((problems == '') & (prices.isna() | (prices < 0)), '價格不是有效的數字')
+    problems = problems.mask(
+        (problems == '') & df['便當品項'].duplicated(keep=False),
+        '品項重複'
+    )
+
+    invalid = problems != ''
+    errors_df = df[invalid].assign(列號=df.index[invalid] + 1, 問題=problems[invalid])
+    valid_df = df[~invalid].assign(價格=prices[~invalid].round().astype(int))
+    return valid_df.reset_index(drop=True), errors_df[['列號', '便當品項', '價格', '問題']]
+
+@instrumented
+def preview_menu_import(store_name, valid_df):
+    """比對匯入資料與店家現有菜單，標示 新增／更新價格／不變"""
+    existing = load_store_menu(store_name)[['便當品項', '價格']]
+    preview = valid_df.merge(existing.rename(columns={'價格': '原價格'}), on='便當品項', how='left')
+    preview['狀態'] = '不變'
+    preview.loc[preview['原價格'].isna(), '狀態'] = '新增'
+    preview.loc[preview['原價格'].notna() & (preview['原價格'] != preview['價格']), '狀態'] = '更新價格'
+    return preview[['便當品項', '原價格', '價格', '狀態']]
+
+@instrumented
+def upsert_menu_items(store_name, valid_df):
+    """以單一交易將品項 upsert 到指定店家（依 store_id + 便當品項），回傳寫入筆數"""
+    with config_transaction() as conn:
+        conn.execute("INSERT OR IGNORE INTO stores (店家名稱) VALUES (?)", (store_name,))
+        store_id = conn.execute("SELECT id FROM stores WHERE 店家名稱 = ?", (store_name,)).fetchone()[0]
+        rows = [
+            (store_id, item, int(price))
+            for item, price in zip(valid_df['便當品項'], valid_df['價格'])
+        ]
+        conn.executemany(
+            "INSERT INTO menu_items (store_id, 便當品項, 價格) VALUES (?, ?, ?) "
+            "ON CONFLICT (store_id, 便當品項) DO UPDATE SET 價格 = excluded.價格",
+            rows
+        )
+    return len(rows)
 
 # --- 設定相關函數 ---
 
+def _read_config():
+    """一次讀出 config 表所有設定（key → value），供各項設定共用同一份快取"""
+    with get_connection() as conn:
+        return dict(conn.execute("SELECT key, value FROM config").fetchall())
+
+@instrumented
 def load_store_config():
     """讀取今日店家設定"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT value FROM config WHERE key = 'today_store'")
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else None
+    return _cached('config', _read_config).get('today_store')
 
+@instrumented
 def save_store_config(store_name):
-    """保存今日店家設定"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("REPLACE INTO config (key, value) VALUES ('today_store', ?)", (store_name,))
-    conn.commit()
-    conn.close()
+    """保存今日店家設定（同時更新今天的預設場次）"""
+    with config_transaction() as conn:
+        conn.execute("REPLACE INTO config (key, value) VALUES ('today_store', ?)", (store_name,))
+        conn.execute(
+            "UPDATE order_sessions SET 店家名稱 = ? WHERE 預設 AND 日期 = ?",
+            (store_name, now_tw().date().isoformat())
+        )
     
+@instrumented
 def load_cutoff_time():
     """讀取截止時間設定"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT value FROM config WHERE key = 'cutoff_time'")
-    result = c.fetchone()
-    conn.close()
+    return _parse_hhmm(_cached('config', _read_config).get('cutoff_time') or '', time(8, 50))
+
+def _parse_hhmm(text, default):
+    """將 'HH:MM'（或 'HH:MM:SS'）轉為 time，格式錯誤時回傳 default"""
+    try:
+        h, m = map(int, str(text).split(':')[:2])
+        return time(h, m)
+    except (ValueError, IndexError):
+        return default
+
+def _read_cutoff_time():
+    with get_connection() as conn:
+        result = conn.execute("SELECT value FROM config WHERE key = 'cutoff_time'").fetchone()
     if result and result[0]:
-        try:
-            h, m = map(int, result[0].split(':'))
-            return time(h, m)
-        except (ValueError, IndexError):
-            return time(8, 50)
+        return _parse_hhmm(result[0], time(8, 50))
     return time(8, 50)
 
+@instrumented
 def save_cutoff_time(cutoff_time):
-    """保存截止時間設定"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    """保存截止時間設定（同時更新今天的預設場次；延後到現在之後時重新開放已被排程關閉的預設場次）"""
     time_str = cutoff_time.strftime("%H:%M")
-    c.execute("REPLACE INTO config (key, value) VALUES ('cutoff_time', ?)", (time_str,))
-    conn.commit()
-    conn.close()
+    now = now_tw()
+    with config_transaction() as conn:
+        conn.execute("REPLACE INTO config (key, value) VALUES ('cutoff_time', ?)", (time_str,))
+        conn.execute(
+            "UPDATE order_sessions SET 截止時間 = ?, 狀態 = CASE WHEN ? > ? THEN ? ELSE 狀態 END "
+            "WHERE 預設 AND 日期 = ?",
+            (time_str, cutoff_time.strftime("%H:%M:%S"), now.strftime("%H:%M:%S"), SESSION_OPEN, now.date().isoformat())
+        )
+
+# --- 訂餐場次 ---
+# 每個場次有自己的店家、開放與截止時間與狀態，訂單以 session_id 歸屬場次。
+# 「今日店家／截止時間」設定會自動產生當天的預設場次，只訂一家店時操作方式不變。
+
+SESSION_OPEN = 'open'
+SESSION_CLOSED = 'closed'
+
+SESSION_COLUMNS = ('id', '名稱', '店家名稱', '日期', '開放時間', '截止時間', '狀態', '預設')
+
+def _session_from_row(row):
+    session = dict(zip(SESSION_COLUMNS, row))
+    session['開放時間'] = _parse_hhmm(session['開放時間'], time(0, 0))
+    session['截止時間'] = _parse_hhmm(session['截止時間'], time(8, 50))
+    session['預設'] = bool(session['預設'])
+    return session
+
+def _read_session(session_id):
+    with get_connection() as conn:
+        row = conn.execute(
+            f"SELECT {', '.join(SESSION_COLUMNS)} FROM order_sessions WHERE id = ?", (int(session_id),)
+        ).fetchone()
+    return _session_from_row(row) if row else None
+
+def _session_accepts_orders(session, now):
+    """場次是否仍在開放時間內且尚未關閉"""
+    if session is None or session['狀態'] != SESSION_OPEN:
+        return False
+    day = datetime.strptime(session['日期'], "%Y-%m-%d").date()
+    return datetime.combine(day, session['開放時間']) <= now <= datetime.combine(day, session['截止時間'])
+
+def ensure_default_session(day=None):
+    """依今日店家與截止時間設定，建立當天的預設場次（已存在或未設定店家時不做任何事）"""
+    day_str = (day or now_tw().date()).isoformat()
+    store_name = load_store_config()
+    if not store_name:
+        return
+    with get_connection() as conn:
+        exists = conn.execute("SELECT 1 FROM order_sessions WHERE 預設 AND 日期 = ?", (day_str,)).fetchone()
+    if exists:
+        return
+    with config_transaction() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO order_sessions (名稱, 店家名稱, 日期, 開放時間, 截止時間, 預設) "
+            "VALUES ('今日訂餐', ?, ?, '00:00', ?, 1)",
+            (store_name, day_str, load_cutoff_time().strftime("%H:%M"))
+        )
+
+@instrumented
+def load_sessions(day=None, status=None):
+    """讀取某一天（預設今天）的訂餐場次，依截止時間排序"""
+    day_str = (day or now_tw().date()).isoformat()
+    return [dict(s) for s in _cached(('sessions', day_str, status), lambda: _read_sessions(day_str, status))]
+
+def _read_sessions(day_str, status):
+    sql = f"SELECT {', '.join(SESSION_COLUMNS)} FROM order_sessions WHERE 日期 = ?"
+    params = [day_str]
+    if status:
+        sql += " AND 狀態 = ?"
+        params.append(status)
+    with get_connection() as conn:
+        rows = conn.execute(sql + " ORDER BY 截止時間, id", params).fetchall()
+    return tuple(_session_from_row(row) for row in rows)
+
+@instrumented
+def load_open_sessions(now=None):
+    """讀取今天狀態為開放、且已到開放時間的場次（會先建立預設場次）"""
+    now = now or now_tw()
+    ensure_default_session(now.date())
+    return [
+        session for session in load_sessions(now.date(), SESSION_OPEN)
+        if session['開放時間'] <= now.time()
+    ]
+
+def _read_menu_snapshot(now):
+    sessions = []
+    for session in load_open_sessions(now):
+        store_name = session['店家名稱']
+        sessions.append({
+            'id': session['id'],
+            '名稱': session['名稱'],
+            '店家名稱': store_name,
+            '截止時間': session['截止時間'].strftime('%H:%M'),
+            '預設': session['預設'],
+            '品項': [
+                {'id': item_id, '便當品項': item, '價格': price}
+                for item_id, (item, price) in load_menu_index(store_name).items()
+            ],
+            '加點選項': [
+                {'id': option_id, '選項': option, '加價': extra_price}
+                for option_id, (option, extra_price) in load_option_index(store_name).items()
+            ],
+        })
+    return {'日期': now.date().isoformat(), '場次': sessions}
+
+@instrumented
+def load_menu_snapshot(now=None):
+    """今天開放中的場次與各場次的品項、加點選項，依設定版本快取；回傳的是共用快取，請勿修改
+
+    場次的開放時間以分鐘為單位，所以快照每分鐘最多重建一次，只保留最新的一份。
+    """
+    now = now or now_tw()
+    minute = now.strftime('%Y-%m-%d %H:%M')
+    snapshots = _cached('menu_snapshot', dict)
+    snapshot = snapshots.get(minute)
+    if snapshot is None:
+        snapshot = _read_menu_snapshot(now)
+        snapshots.clear()
+        snapshots[minute] = snapshot
+    return snapshot
+
+@instrumented
+def create_session(name, store_name, open_time, cutoff_time, day=None):
+    """新增訂餐場次，回傳場次 id"""
+    day_str = (day or now_tw().date()).isoformat()
+    with config_transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO order_sessions (名稱, 店家名稱, 日期, 開放時間, 截止時間) VALUES (?, ?, ?, ?, ?)",
+            (name, store_name, day_str, open_time.strftime("%H:%M"), cutoff_time.strftime("%H:%M"))
+        )
+    return cursor.lastrowid
+
+@instrumented
+def set_session_status(session_id, status):
+    """開放或關閉訂餐場次"""
+    with config_transaction() as conn:
+        conn.execute("UPDATE order_sessions SET 狀態 = ? WHERE id = ?", (status, int(session_id)))
+
+# --- 每週店家輪替 ---
+
+WEEKDAY_NAMES = ('星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日')
+
+@instrumented
+def load_store_rotation():
+    """讀取每週輪替設定 {星期（0 = 星期一）: 店家名稱}"""
+    return dict(_cached('store_rotation', _read_store_rotation))
+
+def _read_store_rotation():
+    with get_connection() as conn:
+        return dict(conn.execute("SELECT 星期, 店家名稱 FROM store_rotation").fetchall())
+
+@instrumented
+def save_store_rotation(rotation):
+    """保存每週輪替設定；值為空的星期不輪替（沿用手動設定的今日店家）"""
+    with config_transaction() as conn:
+        conn.execute("DELETE FROM store_rotation")
+        conn.executemany(
+            "INSERT INTO store_rotation (星期, 店家名稱) VALUES (?, ?)",
+            [(int(weekday), store_name) for weekday, store_name in rotation.items() if store_name]
+        )
+
+@instrumented
+def rotate_today_store(now=None):
+    """每天第一次執行時依輪替設定更換今日店家（之後管理員手動更改不會被覆蓋），回傳換上的店家"""
+    now = now or now_tw()
+    today_str = now.date().isoformat()
+    if _cached('config', _read_config).get('rotation_date') == today_str:
+        return None
+
+    store_name = load_store_rotation().get(now.weekday())
+    if store_name and not (load_store(store_name) or {}).get('啟用'):
+        store_name = None
+    with config_transaction() as conn:
+        conn.execute("REPLACE INTO config (key, value) VALUES ('rotation_date', ?)", (today_str,))
+        if store_name:
+            conn.execute("REPLACE INTO config (key, value) VALUES ('today_store', ?)", (store_name,))
+            conn.execute(
+                "UPDATE order_sessions SET 店家名稱 = ? WHERE 預設 AND 日期 = ?",
+                (store_name, today_str)
+            )
+    ensure_default_session(now.date())
+    return store_name
+
+@instrumented
+def close_expired_sessions(now=None):
+    """關閉已過截止時間（或前幾天）仍為開放的場次，回傳關閉的場次數"""
+    now = now or now_tw()
+    today_str = now.date().isoformat()
+    where = "WHERE 狀態 = ? AND (日期 < ? OR (日期 = ? AND 截止時間 || ':00' < ?))"
+    params = (SESSION_OPEN, today_str, today_str, now.strftime("%H:%M:%S"))
+    with get_connection() as conn:
+        expired = conn.execute(f"SELECT COUNT(*) FROM order_sessions {where}", params).fetchone()[0]
+    if not expired:
+        return 0
+    with config_transaction() as conn:
+        return conn.execute(f"UPDATE order_sessions SET 狀態 = ? {where}", (SESSION_CLOSED,) + params).rowcount
+
+# --- 排程 ---
+# 每個行程一條背景執行緒，每 SCHEDULER_INTERVAL_SECONDS 秒對每個租戶依序執行：
+# 依輪替設定更換今日店家、關閉已過截止時間的場次、封存前幾天的訂單，以及每天一次的資料庫整理。
+# 頁面不再需要在每次重新執行時自行比對時間。
+
+SCHEDULER_ENABLED = os.environ.get('LUNCH_SCHEDULER', '1') != '0'
+SCHEDULER_INTERVAL_SECONDS = 30
+# 每天的資料庫整理只在這段離峰時間內執行（VACUUM 會暫停寫入），行程在其他時間啟動時等到隔天
+NIGHTLY_MAINTENANCE_TIME = time(3, 0)
+NIGHTLY_MAINTENANCE_END = time(5, 0)
+
+_scheduler_lock = threading.Lock()
+_scheduler = {'thread': None}
+_maintenance_dates = {}
+
+def ensure_scheduler():
+    """需要時才啟動排程執行緒（每個行程一條）；LUNCH_SCHEDULER=0 時不啟動
+
+    排程負責輪替今日店家、截止時關閉場次與每天封存訂單，頁面與 API 伺服器啟動時各呼叫一次即可。
+    """
+    if not SCHEDULER_ENABLED:
+        return
+    with _scheduler_lock:
+        thread = _scheduler['thread']
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_scheduler_loop, name='lunch-scheduler', daemon=True)
+            _scheduler['thread'] = thread
+            thread.start()
+
+def _scheduler_loop():
+    while True:
+        run_scheduled_jobs()
+        _time.sleep(SCHEDULER_INTERVAL_SECONDS)
+
+def list_tenants():
+    """回傳預設租戶與 TENANT_DIR 中已有資料庫的租戶代號"""
+    tenants = [DEFAULT_TENANT]
+    if os.path.isdir(TENANT_DIR):
+        tenants += sorted(
+            name[:-3] for name in os.listdir(TENANT_DIR)
+            if name.endswith('.db') and TENANT_ID_PATTERN.match(name[:-3])
+        )
+    return tenants
+
+def run_scheduled_jobs(now=None):
+    """對每個租戶執行一次所有排程工作；單一租戶失敗不影響其他租戶"""
+    now = now or now_tw()
+    for tenant_id in list_tenants():
+        try:
+            with tenant_context(tenant_id):
+                for job in (rotate_today_store, close_expired_sessions, maybe_rollover_orders,
+                            maybe_run_nightly_maintenance):
+                    _run_scheduled_job(job, now)
+        except Exception:
+            logging.getLogger(__name__).exception("租戶 %r 的排程工作失敗", tenant_id)
+
+def _run_scheduled_job(job, now):
+    """執行一項排程工作；只在真的做了事（回傳值為真）或失敗時記錄一筆 scheduler:<工作名稱>，
+    每 30 秒一次、每個租戶都有的空轉檢查不會擠掉監測緩衝區中頁面請求的紀錄"""
+    written = getattr(_local, 'rows_written', 0)
+    lock_wait = getattr(_local, 'lock_wait_ms', 0.0)
+    muted = _metrics_muted.set(True)
+    start = _time.perf_counter()
+    result = None
+    error = True
+    try:
+        result = job(now)
+        error = False
+        return result
+    finally:
+        _metrics_muted.reset(muted)
+        if METRICS_ENABLED and (error or result):
+            record_call(
+                f"scheduler:{job.__name__}",
+                (_time.perf_counter() - start) * 1000,
+                rows_written=getattr(_local, 'rows_written', 0) - written,
+                lock_wait_ms=getattr(_local, 'lock_wait_ms', 0.0) - lock_wait,
+                error=error
+            )
+
+@instrumented
+def maybe_run_nightly_maintenance(now=None):
+    """離峰時段內每天執行一次線上備份與 compact_database()（多個行程只會有一個執行）"""
+    now = now or now_tw()
+    today_str = now.date().isoformat()
+    if not NIGHTLY_MAINTENANCE_TIME <= now.time() < NIGHTLY_MAINTENANCE_END:
+        return False
+    if _maintenance_dates.get(current_tenant()) == today_str:
+        return False
+
+    with transaction() as conn:
+        done = conn.execute("SELECT value FROM config WHERE key = 'last_maintenance_date'").fetchone()
+        if not done or done[0] != today_str:
+            conn.execute("REPLACE INTO config (key, value) VALUES ('last_maintenance_date', ?)", (today_str,))
+    _maintenance_dates[current_tenant()] = today_str
+    if done and done[0] == today_str:
+        return False
+
+    backup_database()
+    compact_database()
+    return True
+
+# --- 資料庫維護 ---
+# 備份使用 SQLite 線上備份 API，每次只複製 BACKUP_PAGES 頁，中間暫停 BACKUP_PAUSE_SECONDS 秒。
+# 備份期間來源連線持有一個讀取交易：WAL 模式下讀取不會擋住寫入，
+# 備份內容是開始時的一致快照，也不會因為其他連線寫入而從頭重來。
+
+BACKUP_DIR = os.path.join(DATA_DIR, 'backups')
+BACKUP_PAGES = 256
+BACKUP_PAUSE_SECONDS = 0.002
+BACKUP_KEEP = 7
+# 可用頁超過總頁數的這個比例才執行 VACUUM（VACUUM 期間會擋住寫入）
+VACUUM_MIN_FREE_RATIO = 0.1
+
+def _backup_dir(tenant_id=None):
+    """備份目錄與資料目錄相同的配置：預設租戶在 BACKUP_DIR，其他租戶在 BACKUP_DIR/tenants/<租戶代號>"""
+    tenant_id = current_tenant() if tenant_id is None else tenant_id
+    return os.path.join(BACKUP_DIR, 'tenants', tenant_id) if tenant_id else BACKUP_DIR
+
+def _backup_prefix(tenant_id=None):
+    return os.path.splitext(os.path.basename(tenant_db_path(tenant_id)))[0] + '-'
+
+@instrumented
+def backup_database(dest_path=None, pages=BACKUP_PAGES, pause=BACKUP_PAUSE_SECONDS, keep=BACKUP_KEEP):
+    """將目前租戶的資料庫線上備份到 dest_path（預設為備份目錄下加上時間的檔名），回傳備份路徑
+
+    先寫到暫存檔，通過 quick_check 後才改名，所以備份目錄中不會留下不完整的檔案；
+    使用預設路徑時只保留最新的 keep 份。
+    """
+    if dest_path is None:
+        dest_path = os.path.join(_backup_dir(), _backup_prefix() + now_tw().strftime('%Y%m%d-%H%M%S') + '.db')
+        prune = True
+    else:
+        prune = False
+    os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest_path) or '.', suffix='.tmp')
+    os.close(fd)
+
+    def pause_between_steps(status, remaining, total):
+        if remaining and pause:
+            _time.sleep(pause)
+
+    try:
+        target = sqlite3.connect(tmp_path)
+        try:
+            with get_connection() as conn:
+                conn.execute("BEGIN")
+                try:
+                    conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+                    conn.backup(target, pages=pages, progress=pause_between_steps)
+                finally:
+                    conn.execute("ROLLBACK")
+            # 備份檔是單一檔案，改回 DELETE 日誌模式，直接複製或開啟都不需要 -wal 檔
+            target.execute("PRAGMA journal_mode=DELETE")
+            problems = _integrity_problems(target, 'quick_check')
+        finally:
+            target.close()
+        if problems:
+            raise sqlite3.DatabaseError(f"備份檔檢查失敗：{problems[0]}")
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if prune:
+        prune_backups(keep)
+    return dest_path
+
+def list_backups(tenant_id=None):
+    """回傳租戶備份目錄中的備份檔路徑（舊到新）"""
+    backup_dir = _backup_dir(tenant_id)
+    if not os.path.isdir(backup_dir):
+        return []
+    prefix = _backup_prefix(tenant_id)
+    return [
+        os.path.join(backup_dir, name) for name in sorted(os.listdir(backup_dir))
+        if name.startswith(prefix) and name.endswith('.db')
+    ]
+
+def prune_backups(keep=BACKUP_KEEP):
+    """只保留目前租戶最新的 keep 份備份，回傳刪除的檔案數"""
+    old = list_backups()[:-keep] if keep > 0 else list_backups()
+    for path in old:
+        os.remove(path)
+    return len(old)
+
+def _integrity_problems(conn, pragma):
+    rows = [row[0] for row in conn.execute(f"PRAGMA {pragma}").fetchall()]
+    return [] if rows == ['ok'] else rows
+
+@instrumented
+def check_integrity(full=False):
+    """檢查目前租戶的資料庫（full 時用較慢的 integrity_check 並檢查外鍵），回傳問題清單，沒有問題時為空"""
+    with get_connection() as conn:
+        problems = _integrity_problems(conn, 'integrity_check' if full else 'quick_check')
+        if full:
+            problems += [
+                f"{table} 第 {rowid} 列的外鍵指向不存在的 {parent}"
+                for table, rowid, parent, _ in conn.execute("PRAGMA foreign_key_check").fetchall()
+            ]
+    return problems
+
+def database_stats():
+    """回傳目前租戶資料庫的頁數、可用頁數與檔案大小（位元組，含 -wal 檔）"""
+    path = tenant_db_path()
+    with get_connection() as conn:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    size = sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+    return {'頁大小': page_size, '頁數': page_count, '可用頁數': freelist, '檔案大小': size}
+
+@instrumented
+def compact_database(analyze=False, min_free_ratio=VACUUM_MIN_FREE_RATIO):
+    """更新查詢統計（analyze 時完整 ANALYZE，否則 PRAGMA optimize），可用頁夠多時 VACUUM，最後截斷 WAL 檔
+
+    回傳整理前後的 database_stats() 與是否執行了 VACUUM。
+    """
+    before = database_stats()
+    vacuumed = before['頁數'] > 0 and before['可用頁數'] / before['頁數'] >= min_free_ratio
+    with get_connection() as conn:
+        conn.execute("ANALYZE" if analyze else "PRAGMA optimize")
+        if vacuumed:
+            conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {'整理前': before, '整理後': database_stats(), 'VACUUM': vacuumed}